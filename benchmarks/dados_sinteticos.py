@@ -0,0 +1,160 @@
+# ##################################################################
+# DADOS SINTÉTICOS PARA OS BENCHMARKS
+# ##################################################################
+
+# Abas de SAVs e RVSs e cadastros de usuários gerados com o Faker, no formato em que chegam do
+# Google Sheets e do MongoDB (itinerários com vários trechos e diárias, como o JotForm grava).
+# Usado por desempenho_app.py e escape_dolar.py.
+
+import random
+
+from faker import Faker
+
+
+CABECALHO_SAVS_INT = [
+    "Submission Date", "Código da viagem:", "CPF:", "Nome completo:", "E-mail:", "Itinerário:", "Diárias",
+    "Qual é a fonte do recurso?", "Descrição do objetivo da viagem:", "Submission ID",
+    "A viagem tem algum custo pago pelo anfitrião?", "Será necessário locação de veículo?", "Observações gerais:",
+]
+CABECALHO_SAVS_EXT = [
+    "Submission Date", "Código da viagem:", "CPF:", "Nome completo:", "E-mail:",
+    "Insira aqui os seus deslocamentos. Cada trecho em uma nova linha:",
+    "Nome do ponto focal no ISPN (a pessoa que está convidando)", "Qual é a fonte do recurso?",
+    "Descrição do objetivo da viagem:", "Submission ID", "Será necessário locação de veículo?", "Observações gerais:",
+]
+CABECALHO_SAVS_TRC = [
+    "Submission Date", "Código da viagem:", "CPF do responsável pela SAV:", "Responsável pela SAV:",
+    "Nome do(a) viajante:", "E-mail:",
+    "Insira aqui os deslocamentos considerando IDA e VOLTA. Cada trecho em uma nova linha:",
+    "Qual é a fonte do recurso?", "Descrição do objetivo da viagem:", "Submission ID",
+    "Será necessário locação de veículo?", "Observações gerais:", "Diárias", "A viagem tem algum custo pago pelo anfitrião?",
+]
+CABECALHO_RVSS = [
+    "Submission Date", "Código da viagem:", "Submission ID", "Qual é a fonte do recurso?", "Período da viagem:",
+    "Cidade(s) de destino:", "Modalidade:", "Modo de transporte até o destino:",
+    "Despesas cobertas pelo anfitrião (descrição e valor):", "Número de pernoites:",
+    "Valor das diárias recebidas (R$):", "Valor gasto com transporte no destino (R$):",
+    "Descreva as atividades realizadas na viagem:", "Principais Resultados / Produtos:",
+    "Inclua 2 fotos da viagem:", "Faça upload dos anexos:", "Observações gerais:",
+]
+
+
+# Gera linhas e cadastros realistas. O Faker é usado para montar conjuntos de nomes, cidades e textos,
+# que depois são sorteados: gerar cada célula com o Faker tornaria os tamanhos grandes lentos demais.
+class Gerador:
+
+    def __init__(self, semente=42):
+        fake = Faker("pt_BR")
+        Faker.seed(semente)
+        self.aleatorio = random.Random(semente)
+        self.fake = fake
+
+        self.cidades = [fake.city() for _ in range(400)]
+        self.nomes = [fake.name() for _ in range(3000)]
+        self.frases = [fake.sentence(nb_words=10) for _ in range(500)]
+        self.fontes = [fake.company() for _ in range(40)]
+
+    def cpf(self):
+        return self.fake.cpf()
+
+    def data_submissao(self):
+        return self.fake.date_time_between("-3y", "+30d").strftime("%Y-%m-%d %H:%M:%S")
+
+    def itinerario(self):
+        sorteio = self.aleatorio
+        inicio = self.fake.date_between("-3y", "+60d")
+        trechos = []
+        for numero in range(sorteio.randint(1, 4)):
+            data = inicio.fromordinal(inicio.toordinal() + numero * sorteio.randint(1, 4))
+            trechos.append(
+                f"Data: {data.strftime('%d-%m-%Y')}, Cidade de partida: {sorteio.choice(self.cidades)}, "
+                f"Cidade de chegada: {sorteio.choice(self.cidades)}, Tipo de transporte: {sorteio.choice(['Aéreo', 'Rodoviário', 'Veículo próprio'])}, "
+                f"Horário de preferência: {sorteio.choice(['Manhã', 'Tarde', 'Noite'])}"
+            )
+        return "\n".join(trechos)
+
+    def diarias(self):
+        sorteio = self.aleatorio
+        return "\n".join(
+            f"Cidade: {sorteio.choice(self.cidades)}, Diárias: {sorteio.randint(1, 5)}, Valor: R$ {sorteio.randint(100, 900)},00"
+            for _ in range(sorteio.randint(1, 3))
+        )
+
+    def frase(self):
+        return self.aleatorio.choice(self.frases)
+
+    def relatorio(self, codigo, submission_id):
+        sorteio = self.aleatorio
+        return [
+            self.data_submissao(), codigo if sorteio.random() < 0.8 else codigo.lower(), submission_id,
+            sorteio.choice(self.fontes), "10/03/2024 a 12/03/2024", sorteio.choice(self.cidades),
+            "Presencial", "Aéreo", "", str(sorteio.randint(0, 6)), f"R$ {sorteio.randint(100, 2000)},00", "R$ 0,00",
+            self.frase(), self.frase(), "https://example.org/foto1.jpg\nhttps://example.org/foto2.jpg",
+            "https://example.org/anexo.pdf", self.frase(),
+        ]
+
+
+# Gera as seis abas e os cadastros de usuários para `submissoes` SAVs internas.
+# As abas de terceiros e de externos têm um quarto desse tamanho; 80% das viagens têm relatório.
+def gerar_dados(submissoes, semente=42):
+    gerador = Gerador(semente)
+    sorteio = gerador.aleatorio
+
+    # Em média 20 viagens por usuário interno e 5 por externo
+    internos = [
+        {"nome_completo": sorteio.choice(gerador.nomes), "cpf": gerador.cpf(), "email": gerador.fake.email(),
+         "genero": sorteio.choice(["Masculino", "Feminino", "Outro"]), "email_coordenador": gerador.fake.email(),
+         "banco": {"nome": "Banco", "agencia": "0001", "conta": "12345-6", "tipo": "Conta Corrente"}}
+        for _ in range(max(1, submissoes // 20))
+    ]
+    externos = [
+        {"nome_completo": sorteio.choice(gerador.nomes), "cpf": gerador.cpf(), "email": gerador.fake.email(),
+         "data_nascimento": "01/01/1990", "genero": sorteio.choice(["Masculino", "Feminino", "Outro"]),
+         "rg": str(sorteio.randint(1000000, 9999999)), "telefone": "61999999999",
+         "banco": {"nome": "Banco", "agencia": "0001", "conta": "12345-6", "tipo": "Conta Corrente"}}
+        for _ in range(max(1, submissoes // 20))
+    ]
+
+    abas = {nome: [cabecalho] for nome, cabecalho in [
+        ("SAVs INTERNAS Portal", CABECALHO_SAVS_INT), ("RVSs INTERNOS Portal", CABECALHO_RVSS),
+        ("SAVs TERCEIROS Portal", CABECALHO_SAVS_TRC), ("RVSs TERCEIROS Portal", CABECALHO_RVSS),
+        ("SAVs EXTERNAS Portal", CABECALHO_SAVS_EXT), ("RVSs EXTERNOS Portal", CABECALHO_RVSS),
+    ]}
+
+    submission_id = 6000000000000000000
+    for i in range(submissoes):
+        submission_id += 1
+        usuario = sorteio.choice(internos)
+        codigo = f"SAV-{i:06d}"
+        abas["SAVs INTERNAS Portal"].append([
+            gerador.data_submissao(), codigo, usuario["cpf"], usuario["nome_completo"], usuario["email"],
+            gerador.itinerario(), gerador.diarias(), sorteio.choice(gerador.fontes), gerador.frase(), str(submission_id),
+            "Não", sorteio.choice(["Sim", "Não"]), gerador.frase(),
+        ])
+        if sorteio.random() < 0.8:
+            abas["RVSs INTERNOS Portal"].append(gerador.relatorio(codigo, str(submission_id + 10**15)))
+
+    for i in range(submissoes // 4):
+        submission_id += 1
+        responsavel = sorteio.choice(internos)
+        viajante = sorteio.choice(externos)
+        codigo = f"TRC-{i:06d}"
+        abas["SAVs TERCEIROS Portal"].append([
+            gerador.data_submissao(), codigo, responsavel["cpf"], responsavel["nome_completo"], viajante["nome_completo"],
+            viajante["email"], gerador.itinerario(), sorteio.choice(gerador.fontes), gerador.frase(), str(submission_id),
+            "Não", gerador.frase(), gerador.diarias(), "Não",
+        ])
+        if sorteio.random() < 0.8:
+            abas["RVSs TERCEIROS Portal"].append(gerador.relatorio(codigo, str(submission_id + 10**15)))
+
+        submission_id += 1
+        codigo = f"EXT-{i:06d}"
+        abas["SAVs EXTERNAS Portal"].append([
+            gerador.data_submissao(), codigo, viajante["cpf"], viajante["nome_completo"], viajante["email"],
+            gerador.itinerario(), sorteio.choice(gerador.nomes), sorteio.choice(gerador.fontes), gerador.frase(),
+            str(submission_id), "Não", gerador.frase(),
+        ])
+        if sorteio.random() < 0.8:
+            abas["RVSs EXTERNOS Portal"].append(gerador.relatorio(codigo, str(submission_id + 10**15)))
+
+    return abas, internos, externos
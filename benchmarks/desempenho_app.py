@@ -0,0 +1,161 @@
+# ##################################################################
+# BENCHMARK: LOGIN E HOME COM DADOS SINTÉTICOS
+# ##################################################################
+
+# Mede como o login (check_cpf), a carga das abas e a home_page escalam com o tamanho da planilha
+# e das coleções de usuários, sem Google Sheets, MongoDB ou SMTP de verdade:
+#
+# - as abas de SAVs e RVSs e os cadastros de usuários são gerados com o Faker (dados_sinteticos.py);
+# - o cliente do gspread é trocado por uma planilha em memória, o MongoClient pelo mongomock
+#   e o SMTP por um servidor falso (substitutos.py);
+# - o main.py é executado pelo AppTest do Streamlit, como numa sessão de verdade.
+#
+# Cada tamanho roda num processo separado, para que os caches de um não contem no outro e para que
+# o pico de memória (ru_maxrss) seja só daquele tamanho.
+#
+# Uso: python benchmarks/desempenho_app.py [--reruns 20] [número de submissões ...]
+# Requer o mongomock, que não faz parte do requirements.txt do app: pip install mongomock
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from dados_sinteticos import gerar_dados
+from substitutos import RAIZ, SEGREDOS, instalar_substitutos
+
+
+SCRIPT = os.path.join(RAIZ, "main.py")
+
+TAMANHOS_PADRAO = [1_000, 10_000, 100_000]
+
+
+# ##################################################################
+# MEDIÇÃO
+# ##################################################################
+
+def nova_sessao():
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(SCRIPT, default_timeout=900)
+    for chave, valor in SEGREDOS.items():
+        app.secrets[chave] = valor
+    return app
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    funcao()
+    return time.perf_counter() - inicio
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def verificar(app, etapa):
+    if app.exception:
+        raise RuntimeError(f"Erro em {etapa}: {app.exception[0].message}")
+
+
+# Mede um tamanho, neste processo. Devolve um dicionário com os tempos em segundos.
+def medir_tamanho(submissoes, reruns):
+    inicio = time.perf_counter()
+    abas, internos, externos = gerar_dados(submissoes)
+    geracao = time.perf_counter() - inicio
+    planilha = instalar_substitutos(abas, internos, externos)
+
+    # O usuário com mais viagens é o pior caso da home
+    viagens_por_cpf = {}
+    for linha in abas["SAVs INTERNAS Portal"][1:]:
+        viagens_por_cpf[linha[2]] = viagens_por_cpf.get(linha[2], 0) + 1
+    cpf_usuario = max(viagens_por_cpf, key=viagens_por_cpf.get)
+
+    resultado = {"submissoes": submissoes, "geracao_dados": geracao, "viagens_usuario": viagens_por_cpf[cpf_usuario]}
+
+    # Login: consulta do CPF (check_cpf). O primeiro login do processo inclui a criação dos índices
+    # do CPF normalizado; o segundo mostra o custo de um login comum.
+    for etapa in ["login_check_cpf_frio", "login_check_cpf"]:
+        app = nova_sessao()
+        app.run()
+        verificar(app, "login")
+        app.text_input[0].input(cpf_usuario)
+        app.button[0].click()
+        resultado[etapa] = cronometrar(app.run)
+        verificar(app, "check_cpf")
+
+    # Home logada. A primeira execução carrega e trata as abas (cache frio).
+    usuario = app.session_state["usuario"]
+    app = nova_sessao()
+    app.session_state["usuario"] = usuario
+    app.session_state["tipo_usuario"] = "interno"
+    app.session_state["logged_in"] = "logado"
+    resultado["home_cache_frio"] = cronometrar(app.run)
+    verificar(app, "home")
+    resultado["requisicoes_sheets"] = planilha.requisicoes
+
+    # Reruns com o cache quente, em cada visão da home
+    for visao in ["minhas_viagens", "nova_sav", "terceiros"]:
+        app.radio(key="visao_home").set_value(visao)
+        app.run()
+        verificar(app, visao)
+        tempos = [cronometrar(app.run) for _ in range(reruns)]
+        resultado[f"rerun_{visao}_p50"] = percentil(tempos, 0.50)
+        resultado[f"rerun_{visao}_p95"] = percentil(tempos, 0.95)
+
+    # Pico de memória do processo, em MB (ru_maxrss vem em KB no Linux)
+    resultado["pico_memoria_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do login e da home com dados sintéticos")
+    parser.add_argument("tamanhos", nargs="*", type=int, default=TAMANHOS_PADRAO, help="números de submissões")
+    parser.add_argument("--reruns", type=int, default=20, help="reruns medidos em cada visão")
+    parser.add_argument("--um-tamanho", action="store_true", help=argparse.SUPPRESS)
+    argumentos = parser.parse_args()
+
+    # Processo filho: mede um tamanho e devolve o resultado em JSON
+    if argumentos.um_tamanho:
+        print(json.dumps(medir_tamanho(argumentos.tamanhos[0], argumentos.reruns)))
+        return
+
+    colunas = [
+        ("submissoes", "submissões", "{:>11}"),
+        ("viagens_usuario", "viagens", "{:>8}"),
+        ("login_check_cpf_frio", "cpf frio", "{:>8.0f}ms"),
+        ("login_check_cpf", "cpf quente", "{:>10.0f}ms"),
+        ("home_cache_frio", "home fria", "{:>9.0f}ms"),
+        ("rerun_minhas_viagens_p50", "minhas p50", "{:>10.0f}ms"),
+        ("rerun_minhas_viagens_p95", "minhas p95", "{:>10.0f}ms"),
+        ("rerun_nova_sav_p50", "nova p50", "{:>8.0f}ms"),
+        ("rerun_nova_sav_p95", "nova p95", "{:>8.0f}ms"),
+        ("rerun_terceiros_p50", "terc. p50", "{:>9.0f}ms"),
+        ("rerun_terceiros_p95", "terc. p95", "{:>9.0f}ms"),
+        ("pico_memoria_mb", "memória", "{:>6.0f}MB"),
+    ]
+    print(" ".join(f"{titulo:>{len(formato.format(0))}}" for _, titulo, formato in colunas))
+
+    for tamanho in argumentos.tamanhos:
+        processo = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--um-tamanho", "--reruns", str(argumentos.reruns), str(tamanho)],
+            cwd=RAIZ, capture_output=True, text=True,
+        )
+        if processo.returncode != 0:
+            print(f"{tamanho:>11} falhou:\n{processo.stderr[-2000:]}")
+            continue
+
+        resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+        valores = []
+        for chave, _, formato in colunas:
+            valor = resultado[chave]
+            valores.append(formato.format(valor * 1000 if formato.endswith("ms") else valor))
+        print(" ".join(valores))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# ##################################################################
+# BENCHMARK: ESCAPE DO $ NA CARGA X NA RENDERIZAÇÃO
+# ##################################################################
+
+# Compara o tempo de tratamento de uma aba grande de SAVs (tratar_savs_int do main.py) com o escape do $
+# feito na carga (replace com regex no DataFrame inteiro, como era antes) e sem ele, e mede o custo de
+# escapar com o escapar_markdown do main.py só os campos de uma página de viagens na hora de mostrar.
+#
+# Uso: python benchmarks/escape_dolar.py [número de linhas ...]
+# Não depende do Google Sheets nem do st.secrets: a aba é gerada com o Faker (dados_sinteticos.py) e o main.py
+# é importado com os substitutos (substitutos.py, que requer o mongomock).
+
+import sys
+import time
+
+from dados_sinteticos import gerar_dados
+from substitutos import importar_main, instalar_substitutos
+
+
+# Colunas de uma linha da lista de viagens (mostrar_linhas_viagens) e campos de texto do diálogo de detalhes
+COLUNAS_LISTA = ["Código da viagem:", "Data inicial:", "Destinos:"]
+CAMPOS_DETALHES = [
+    "Código da viagem:", "Descrição do objetivo da viagem:", "Qual é a fonte do recurso?",
+    "A viagem tem algum custo pago pelo anfitrião?", "Será necessário locação de veículo?", "Observações gerais:",
+]
+
+
+# Tratamento da aba pelo main.py, com ou sem o escape antigo do $ em todas as células
+def carregar(main, valores, escapar_na_carga):
+    df = main.tratar_savs_int(valores)
+    if escapar_na_carga:
+        df = df.replace({r'\$': r'\\$'}, regex=True)
+    return df
+
+
+# Escape feito só no que uma página mostra: as linhas da lista e os detalhes de uma viagem
+def escapar_pagina(main, df):
+    pagina = df.head(main.LIMITE_LISTA_DETALHADA)
+    for valores in main.formatar_datas(pagina[COLUNAS_LISTA]).itertuples(index=False):
+        for valor in valores:
+            main.escapar_markdown(valor)
+
+    row = pagina.iloc[0]
+    for campo in CAMPOS_DETALHES:
+        main.escapar_markdown(row[campo])
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    tamanhos = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+
+    # O main.py é importado uma vez só; a aba de cada tamanho é passada direto para o tratamento
+    instalar_substitutos(*gerar_dados(0))
+    app = importar_main()
+
+    print(f"{'linhas':>8} {'carga c/ escape':>16} {'carga s/ escape':>16} {'economia':>9} {'escape da página':>17}")
+    for linhas in tamanhos:
+        valores = gerar_dados(linhas)[0]["SAVs INTERNAS Portal"]
+        repeticoes = 5 if linhas <= 10_000 else 2
+
+        com_escape = medir(lambda: carregar(app, valores, True), repeticoes)
+        sem_escape = medir(lambda: carregar(app, valores, False), repeticoes)
+        df = carregar(app, valores, False)
+        pagina = medir(lambda: escapar_pagina(app, df), repeticoes)
+
+        print(f"{linhas:>8} {com_escape * 1000:>14.1f}ms {sem_escape * 1000:>14.1f}ms "
+              f"{(1 - sem_escape / com_escape) * 100:>8.0f}% {pagina * 1000:>15.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
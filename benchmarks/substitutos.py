@@ -0,0 +1,155 @@
+# ##################################################################
+# SUBSTITUTOS DO GOOGLE SHEETS, DO MONGODB E DO SMTP
+# ##################################################################
+
+# Trocam as conexões externas do main.py por versões em memória, para rodar o app nos benchmarks:
+# o cliente do gspread por uma planilha em memória, o MongoClient pelo mongomock e o SMTP por um servidor falso.
+# Requer o mongomock, que não faz parte do requirements.txt do app: pip install mongomock
+
+import importlib
+import os
+import re
+import smtplib
+import sys
+import unicodedata
+
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Responde ao values_batch_get como a API do Google Sheets: intervalos em notação A1 com o nome da aba,
+# células vazias no fim das linhas omitidas.
+class PlanilhaFalsa:
+
+    id = "planilha-benchmark"
+
+    def __init__(self, abas):
+        self.abas = abas
+        self.requisicoes = 0
+
+    def values_batch_get(self, intervalos, params=None):
+        self.requisicoes += 1
+        respostas = []
+        for intervalo in intervalos:
+            nome_aba, inicio, fim = self._ler_intervalo(intervalo)
+            linhas = []
+            for linha in self.abas[nome_aba][inicio - 1:fim]:
+                linha = list(linha)
+                while linha and linha[-1] == "":
+                    linha.pop()
+                linhas.append(linha)
+            resposta = {"range": intervalo}
+            if linhas:
+                resposta["values"] = linhas
+            respostas.append(resposta)
+        return {"valueRanges": respostas}
+
+    def get_lastUpdateTime(self):
+        # A planilha não muda durante o benchmark
+        return "2024-01-01T00:00:00.000Z"
+
+    @staticmethod
+    def _ler_intervalo(intervalo):
+        encontrado = re.match(r"^'((?:[^']|'')*)'(?:![A-Z]*(\d*)(?::[A-Z]*(\d*))?)?$", intervalo)
+        nome_aba = encontrado.group(1).replace("''", "'")
+        inicio = int(encontrado.group(2)) if encontrado.group(2) else 1
+        fim = int(encontrado.group(3)) if encontrado.group(3) else None
+        return nome_aba, inicio, fim
+
+
+class ClienteSheetsFalso:
+    def __init__(self, planilha):
+        self.planilha = planilha
+
+    def set_timeout(self, timeout):
+        pass
+
+    def open_by_key(self, chave):
+        return self.planilha
+
+
+class SMTPFalso:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def ehlo(self):
+        pass
+
+    def has_extn(self, nome):
+        return False
+
+    def login(self, usuario, senha):
+        pass
+
+    def send_message(self, msg, *args, **kwargs):
+        pass
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+SEGREDOS = {
+    "senhas": {"string_conexao": "mongodb://benchmark", "endereco_email": "portal@example.org", "senha_email": "x"},
+    "ids": {"id_planilha_recebimento": "planilha-benchmark"},
+    "credentials_drive": {"type": "service_account"},
+    "links": {nome: f"https://example.org/{nome}" for nome in
+              ["url_sav_int", "url_sav_ext", "url_sav_trc", "url_rvs_int", "url_rvs_ext", "url_rvs_trc"]},
+    # Sem cópia em disco: mede a carga a partir da planilha
+    "cache": {"diretorio_espelho": ""},
+    # Sem exportador de métricas: os tamanhos rodam em processos que não precisam da porta
+    "metricas": {"porta": 0},
+}
+
+
+def cadastro_migrado(usuario, busca=False):
+    documento = dict(usuario, cpf_normalizado=re.sub(r"\D", "", usuario["cpf"]))
+    if busca:
+        sem_acentos = unicodedata.normalize("NFKD", usuario["nome_completo"]).encode("ascii", "ignore").decode("ascii")
+        documento["palavras_busca"] = sem_acentos.lower().split()
+    return documento
+
+
+# Troca as conexões externas pelos substitutos. Tem que rodar antes do AppTest executar o main.py.
+def instalar_substitutos(abas, internos, externos):
+    import gspread
+    import mongomock
+    import pymongo
+    from google.oauth2 import service_account
+
+    planilha = PlanilhaFalsa(abas)
+    gspread.authorize = lambda *args, **kwargs: ClienteSheetsFalso(planilha)
+    service_account.Credentials.from_service_account_info = classmethod(lambda cls, *args, **kwargs: object())
+
+    # Os cadastros já entram migrados (cpf_normalizado e palavras_busca), como no banco de produção:
+    # a migração roda uma vez só e, no mongomock, custaria mais que tudo o que se quer medir
+    cliente_mongo = mongomock.MongoClient()
+    banco = cliente_mongo["plataforma_sav"]
+    banco["usuarios_internos"].insert_many([cadastro_migrado(usuario) for usuario in internos])
+    banco["usuarios_externos"].insert_many([cadastro_migrado(usuario, busca=True) for usuario in externos])
+    pymongo.MongoClient = lambda *args, **kwargs: cliente_mongo
+
+    smtplib.SMTP_SSL = SMTPFalso
+    smtplib.SMTP = SMTPFalso
+
+    return planilha
+
+
+# Importa o main.py neste processo, fora do `streamlit run`, para chamar as funções dele diretamente.
+# Os substitutos têm que estar instalados antes: a importação executa o script (conexão com o banco,
+# página de login etc.) com os elementos do Streamlit sem efeito.
+def importar_main():
+    import streamlit as st
+    from streamlit.runtime.secrets import Secrets
+
+    segredos = Secrets()
+    segredos._secrets = SEGREDOS
+    st.secrets = segredos
+
+    # Os caminhos do main.py (imagens etc.) são relativos à raiz do repositório, como no `streamlit run`
+    os.chdir(RAIZ)
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    return importlib.import_module("main")
@@ -1,18 +1,51 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+from pymongo.monitoring import CommandListener
 from datetime import date
 import re
+import unicodedata
 import random
 import smtplib
 from email.mime.text import MIMEText
 import time
-from urllib.parse import quote
+import threading
+import hashlib
+import queue
+from collections import deque
+from cachetools import LRUCache
+from urllib.parse import quote, parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.parser import BytesParser
+from email import policy as email_policy
 import streamlit.components.v1 as components
+import logging
+import uuid
+import cProfile
+import marshal
+import hmac
+from contextlib import contextmanager
+from prometheus_client import CollectorRegistry, Counter, Histogram, ProcessCollector, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
 
 
 import gspread
+from gspread.utils import absolute_range_name, fill_gaps, rowcol_to_a1
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import AuthorizedSession, Request
+import requests
+from requests.adapters import HTTPAdapter
+import os
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+
+# Logger da aplicação, usado nas rotinas que rodam fora da interface
+logger = logging.getLogger("portal_savs")
 
 
 
@@ -38,6 +71,228 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# Configurações da interface, lidas da seção [interface] do st.secrets (opcional)
+config_interface = st.secrets.get("interface", {})
+
+# Listas de viagens maiores que isso são mostradas numa tabela única, em vez de uma linha de botões por viagem
+LIMITE_LISTA_DETALHADA = int(config_interface.get("limite_lista_detalhada", 30))
+
+# Opções de quantidade de viagens por página nas listas de viagens. A primeira é o padrão.
+TAMANHOS_PAGINA = [10, 25, 50, 100]
+
+# Visões da home de cada tipo de usuário ({chave: rótulo}), na ordem em que aparecem na navegação
+VISOES_POR_TIPO_USUARIO = {
+    "interno": {
+        "minhas_viagens": ":material/flight_takeoff: Minhas Viagens",
+        "nova_sav": ":material/add: Nova Solicitação de Viagem",
+        "terceiros": ":material/group: Solicitações para Terceiros",
+    },
+    "externo": {
+        "minhas_viagens": ":material/flight_takeoff: Minhas Viagens",
+        "nova_sav": ":material/add: Nova Solicitação de Viagem",
+    },
+}
+
+
+
+# ##################################################################
+# MÉTRICAS (PROMETHEUS)
+# ##################################################################
+
+# Configurações das métricas, lidas da seção [metricas] do st.secrets (opcional).
+# As métricas são servidas numa porta própria (http://endereco:porta/metrics), fora do servidor do Streamlit.
+# Com porta = 0 o exportador não é iniciado. Por padrão só escuta em 127.0.0.1; para o Prometheus coletar
+# de outra máquina, use endereco = "0.0.0.0" (ou o IP da rede interna).
+config_metricas = st.secrets.get("metricas", {})
+PORTA_METRICAS = int(config_metricas.get("porta", 9464))
+ENDERECO_METRICAS = config_metricas.get("endereco", "127.0.0.1")
+
+# Uma sessão conta como ativa se teve algum rerun nesse intervalo (segundos)
+JANELA_SESSOES_ATIVAS = int(config_metricas.get("janela_sessoes_ativas", 300))
+
+
+# Métricas do portal no formato do Prometheus, compartilhadas entre as sessões do processo.
+# Ficam num registro próprio, e não no registro global do prometheus_client, para que o objeto possa ser
+# recriado (ao limpar o cache_resource) sem erro de métrica duplicada.
+# Os números que os objetos do portal já contam (acertos dos caches, fila de e-mails, sessões) não são
+# duplicados: são lidos deles só na hora da coleta, sem custo nos reruns.
+class MetricasPortal:
+    def __init__(self, janela_sessoes_ativas):
+        self.registro = CollectorRegistry()
+        self.janela_sessoes_ativas = janela_sessoes_ativas
+
+        self.sheets_duracao = Histogram(
+            "portal_savs_sheets_duracao_segundos", "Duração das chamadas à API do Google Sheets",
+            ["operacao"], registry=self.registro,
+        )
+        self.sheets_erros = Counter(
+            "portal_savs_sheets_erros", "Chamadas à API do Google Sheets que falharam",
+            ["operacao"], registry=self.registro,
+        )
+        self.mongo_duracao = Histogram(
+            "portal_savs_mongo_duracao_segundos", "Duração dos comandos enviados ao MongoDB",
+            ["comando", "colecao"], registry=self.registro,
+        )
+        self.mongo_erros = Counter(
+            "portal_savs_mongo_erros", "Comandos do MongoDB que falharam",
+            ["comando", "colecao"], registry=self.registro,
+        )
+        self.smtp_duracao = Histogram(
+            "portal_savs_smtp_duracao_segundos", "Duração de cada tentativa de envio de e-mail pelo pool SMTP",
+            registry=self.registro,
+        )
+        self.smtp_erros = Counter(
+            "portal_savs_smtp_erros", "Tentativas de envio de e-mail que falharam", registry=self.registro,
+        )
+        self.rerun_duracao = Histogram(
+            "portal_savs_rerun_duracao_segundos", "Duração de cada execução do script, por página",
+            ["pagina"], registry=self.registro,
+        )
+        self.home_fase_duracao = Histogram(
+            "portal_savs_home_fase_duracao_segundos", "Duração de cada fase da home_page",
+            ["fase"], registry=self.registro,
+        )
+        ProcessCollector(registry=self.registro)
+        self.registro.register(self)
+
+        self._lock = threading.Lock()
+        self._fontes_cache = {}     # nome do cache -> função que devolve as estatísticas do cache
+        self._consultas = {}        # (nome do cache, resultado) -> consultas contadas por contar_consulta
+        self._fila_emails = None    # função que devolve as métricas da fila de e-mails
+        self._sessoes = {}          # id da sessão -> (último rerun, página)
+
+    # Registra um cache que já conta os próprios acertos. estatisticas() deve devolver um dicionário
+    # com "acertos" e "falhas" (e, opcionalmente, "expirados").
+    def observar_cache(self, nome, estatisticas):
+        with self._lock:
+            self._fontes_cache[nome] = estatisticas
+
+    # Conta a consulta a um cache que não tem contadores próprios
+    def contar_consulta(self, nome, acerto):
+        chave = (nome, "acertos" if acerto else "falhas")
+        with self._lock:
+            self._consultas[chave] = self._consultas.get(chave, 0) + 1
+
+    def observar_fila_emails(self, metricas_fila):
+        with self._lock:
+            self._fila_emails = metricas_fila
+
+    def registrar_sessao(self, id_sessao, pagina):
+        with self._lock:
+            agora = time.monotonic()
+            self._sessoes[id_sessao] = (agora, pagina)
+            # Também descarta aqui: sem ninguém lendo /metrics, as sessões encerradas se acumulariam
+            self._descartar_sessoes_inativas(agora)
+
+    # Descarta as sessões sem rerun dentro da janela. Chamado com o lock
+    def _descartar_sessoes_inativas(self, agora):
+        limite = agora - self.janela_sessoes_ativas
+        self._sessoes = {id_sessao: sessao for id_sessao, sessao in self._sessoes.items() if sessao[0] >= limite}
+
+    def describe(self):
+        # Sem descrição prévia: o registro não chama collect() ao registrar o coletor
+        return []
+
+    def collect(self):
+        with self._lock:
+            fontes_cache = list(self._fontes_cache.items())
+            consultas = dict(self._consultas)
+            fila_emails = self._fila_emails
+
+            # Descarta as sessões sem rerun dentro da janela e conta as restantes por página
+            self._descartar_sessoes_inativas(time.monotonic())
+            sessoes_por_pagina = {}
+            for _, pagina in self._sessoes.values():
+                sessoes_por_pagina[pagina] = sessoes_por_pagina.get(pagina, 0) + 1
+
+        # Caches: consultas por resultado e taxa de acerto
+        for (nome, estatisticas) in fontes_cache:
+            valores = estatisticas()
+            for resultado in ("acertos", "expirados", "falhas"):
+                if resultado in valores:
+                    consultas[(nome, resultado)] = valores[resultado]
+
+        familia_consultas = CounterMetricFamily(
+            "portal_savs_cache_consultas", "Consultas aos caches do portal, por resultado", labels=["cache", "resultado"],
+        )
+        familia_taxa = GaugeMetricFamily(
+            "portal_savs_cache_taxa_acerto", "Fração das consultas aos caches respondidas sem recarregar", labels=["cache"],
+        )
+        for (nome, resultado), total in sorted(consultas.items()):
+            familia_consultas.add_metric([nome, resultado], total)
+        for nome in sorted({nome for nome, _ in consultas}):
+            total = sum(valor for (cache, _), valor in consultas.items() if cache == nome)
+            acertos = consultas.get((nome, "acertos"), 0) + consultas.get((nome, "expirados"), 0)
+            familia_taxa.add_metric([nome], acertos / total if total else 0.0)
+        yield familia_consultas
+        yield familia_taxa
+
+        # Sessões ativas, por página (login, home etc.)
+        familia_sessoes = GaugeMetricFamily(
+            "portal_savs_sessoes_ativas", "Sessões com algum rerun na janela de atividade", labels=["pagina"],
+        )
+        for pagina, total in sorted(sessoes_por_pagina.items()):
+            familia_sessoes.add_metric([pagina], total)
+        yield familia_sessoes
+
+        # Fila de e-mails: profundidade, envios e latência da fila até a entrega
+        if fila_emails is not None:
+            valores = fila_emails()
+            yield GaugeMetricFamily("portal_savs_emails_na_fila", "E-mails esperando envio", value=valores["profundidade"])
+            yield CounterMetricFamily("portal_savs_emails_enviados", "E-mails entregues ao servidor SMTP", value=valores["enviados"])
+            yield CounterMetricFamily("portal_savs_emails_falhas", "E-mails que falharam em todas as tentativas", value=valores["falhas"])
+            latencias = GaugeMetricFamily(
+                "portal_savs_emails_latencia_segundos", "Tempo da fila até a entrega, nos envios mais recentes", labels=["quantil"],
+            )
+            for quantil, chave in [("0.5", "latencia_p50"), ("0.95", "latencia_p95")]:
+                if valores[chave] is not None:
+                    latencias.add_metric([quantil], valores[chave])
+            yield latencias
+
+
+# Mede a duração de cada comando enviado ao MongoDB (find, update, insert...), pelos eventos do pymongo
+class OuvinteComandosMongo(CommandListener):
+    def __init__(self, metricas):
+        self.metricas = metricas
+        self._colecoes = {}     # (conexão, request_id) -> coleção do comando em andamento
+
+    def started(self, event):
+        # O nome da coleção só vem no evento de início: o valor do próprio comando ({"find": "usuarios_internos", ...})
+        colecao = event.command.get(event.command_name)
+        self._colecoes[(event.connection_id, event.request_id)] = colecao if isinstance(colecao, str) else ""
+
+    def _terminar(self, event):
+        colecao = self._colecoes.pop((event.connection_id, event.request_id), "")
+        self.metricas.mongo_duracao.labels(event.command_name, colecao).observe(event.duration_micros / 1e6)
+        return colecao
+
+    def succeeded(self, event):
+        self._terminar(event)
+
+    def failed(self, event):
+        colecao = self._terminar(event)
+        self.metricas.mongo_erros.labels(event.command_name, colecao).inc()
+
+
+# Métricas do processo, com um único exportador HTTP por processo.
+# Se a porta estiver ocupada (outro processo do portal na mesma máquina), o portal segue sem exportador.
+@st.cache_resource(show_spinner=False)
+def obter_metricas():
+    metricas = MetricasPortal(JANELA_SESSOES_ATIVAS)
+
+    if PORTA_METRICAS:
+        try:
+            start_http_server(PORTA_METRICAS, addr=ENDERECO_METRICAS, registry=metricas.registro)
+        except OSError as e:
+            logger.warning("Não foi possível iniciar o exportador de métricas na porta %s: %s", PORTA_METRICAS, e)
+
+    return metricas
+
+
+# Mede a duração de uma fase da home_page
+def medir_fase_home(fase):
+    return obter_metricas().home_fase_duracao.labels(fase).time()
+
 
 
 # ##################################################################
@@ -48,37 +303,344 @@ st.markdown(
 # Conectar Mongo Atlas
 # Obtém a string de conexeão do st.secrets
 MONGODB_URI = st.secrets['senhas']['string_conexao']
-# Cliente do Mongo Atlas (nuvem)
-cliente = MongoClient(MONGODB_URI)
 
-# Conectar ao MongoDB local
-# cliente = MongoClient('mongodb://localhost:27017/')  # Cria uma conexão com o banco de dados MongoDB
+# Configurações da conexão, lidas da seção [mongo] do st.secrets (opcional)
+config_mongo = st.secrets.get("mongo", {})
+
+
+# Cliente do Mongo Atlas (nuvem), criado uma vez por processo e compartilhado entre as sessões.
+# Os timeouts evitam que um handshake lento com o Atlas trave a página de login.
+@st.cache_resource(show_spinner=False)
+def conectar_mongo():
+    cliente = MongoClient(
+        MONGODB_URI,
+        maxPoolSize=int(config_mongo.get("max_pool_size", 20)),
+        minPoolSize=int(config_mongo.get("min_pool_size", 0)),
+        maxIdleTimeMS=int(config_mongo.get("max_idle_time_ms", 300000)),
+        serverSelectionTimeoutMS=int(config_mongo.get("server_selection_timeout_ms", 5000)),
+        connectTimeoutMS=int(config_mongo.get("connect_timeout_ms", 5000)),
+        socketTimeoutMS=int(config_mongo.get("socket_timeout_ms", 10000)),
+        event_listeners=[OuvinteComandosMongo(obter_metricas())],
+    )
+
+    # Conectar ao MongoDB local
+    # cliente = MongoClient('mongodb://localhost:27017/')  # Cria uma conexão com o banco de dados MongoDB
+
+    # Health check: se o servidor não responder dentro do serverSelectionTimeoutMS, levanta erro.
+    # Com erro, o cliente é fechado (senão as threads de monitoramento dele ficam vivas), não fica no cache
+    # e a próxima execução tenta de novo.
+    try:
+        cliente.admin.command("ping")
+    except Exception:
+        cliente.close()
+        raise
+
+    return cliente
 
-banco_de_dados = cliente["plataforma_sav"]  # Seleciona o banco de dados
+
+try:
+    cliente = conectar_mongo()
+    banco_de_dados = cliente["plataforma_sav"]  # Seleciona o banco de dados
+except PyMongoError as e:
+    # A página mostra o erro na navegação, em vez de travar ou quebrar
+    logger.error("Falha ao conectar ao MongoDB: %s", e)
+    cliente = None
+    banco_de_dados = None
+
+# Coleções de usuários que são consultadas pelo CPF no login
+COLECOES_USUARIOS = ["usuarios_internos", "usuarios_externos"]
+
+
+# Preenche o campo cpf_normalizado (só os números do CPF) nos documentos antigos que ainda não têm
+def migrar_cpf_normalizado():
+    total = 0
+
+    for nome_colecao in COLECOES_USUARIOS:
+        colecao = banco_de_dados[nome_colecao]
+
+        # Percorre apenas os documentos que ainda não têm o campo
+        for documento in colecao.find({"cpf_normalizado": {"$exists": False}}, {"cpf": 1}):
+            colecao.update_one(
+                {"_id": documento["_id"]},
+                {"$set": {"cpf_normalizado": normalizar_cpf(documento.get("cpf"))}}
+            )
+            total += 1
+
+    return total
+
+
+# Garante a migração e o índice único do CPF normalizado. Roda uma vez por processo.
+@st.cache_resource(show_spinner=False)
+def garantir_indices_cpf():
+    migrar_cpf_normalizado()
+
+    for nome_colecao in COLECOES_USUARIOS:
+        try:
+            # O filtro parcial deixa de fora documentos sem CPF, que não podem ser únicos
+            banco_de_dados[nome_colecao].create_index(
+                "cpf_normalizado",
+                name="cpf_normalizado_unico",
+                unique=True,
+                partialFilterExpression={"cpf_normalizado": {"$gt": ""}},
+            )
+        except OperationFailure as e:
+            # Se houver CPFs duplicados, o índice único não é criado. O login continua funcionando, só que sem índice.
+            logger.warning("Não foi possível criar o índice único de CPF em %s: %s", nome_colecao, e)
+
+
+# Preenche o campo palavras_busca (palavras do nome, sem acentos) nos viajantes externos que ainda não têm
+def migrar_palavras_busca():
+    colecao = banco_de_dados["usuarios_externos"]
+    total = 0
+
+    for documento in colecao.find({"palavras_busca": {"$exists": False}}, {"nome_completo": 1}):
+        colecao.update_one(
+            {"_id": documento["_id"]},
+            {"$set": {"palavras_busca": palavras_busca(documento.get("nome_completo"))}}
+        )
+        total += 1
+
+    return total
+
+
+# Garante a migração e o índice da busca de viajantes externos por nome. Roda uma vez por processo.
+# O índice é multichave (uma entrada por palavra) e atende as buscas por prefixo (regex ancorada em ^).
+@st.cache_resource(show_spinner=False)
+def garantir_indice_busca_externos():
+    migrar_palavras_busca()
+    banco_de_dados["usuarios_externos"].create_index("palavras_busca", name="palavras_busca")
 
 
 # ##################################################################
 # CONEXÃO COM GOOGLE SHEETS
 # ##################################################################
 
-# Escopo necessário para acessar os dados do Google Sheets
+# Escopos necessários para acessar os dados do Google Sheets e a data de modificação da planilha no Drive
 scope = [
-    "https://www.googleapis.com/auth/spreadsheets"
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
 ]
 
-# Autenticação usando a conta de serviço
-
-# Ler credenciais do st.secrets
-creds_dict = st.secrets["credentials_drive"]
-# Criar credenciais do Google usando os dados do st.secrets
-creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
-
-client = gspread.authorize(creds)
+# Configurações da conexão, lidas da seção [sheets] do st.secrets (opcional)
+config_sheets = st.secrets.get("sheets", {})
 
 # ID da planilha
 sheet_id = st.secrets.ids.id_planilha_recebimento
 
 
+# Cria uma sessão HTTP com conexões keep-alive, para reaproveitar o TLS entre as requisições
+def criar_sessao_http(sessao):
+    adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=int(config_sheets.get("pool_maxsize", 10)))
+    sessao.mount("https://", adaptador)
+    return sessao
+
+
+# Cliente do gspread, criado uma vez por processo e compartilhado entre as sessões.
+# Evita refazer a autorização e o handshake TLS a cada rerun do Streamlit.
+@st.cache_resource(show_spinner=False)
+def conectar_google_sheets():
+
+    # Autenticação usando a conta de serviço
+
+    # Ler credenciais do st.secrets
+    creds_dict = st.secrets["credentials_drive"]
+    # Criar credenciais do Google usando os dados do st.secrets
+    creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
+
+    # A renovação do token usa sempre a mesma sessão HTTP, também mantida aberta
+    sessao_token = criar_sessao_http(requests.Session())
+    sessao = criar_sessao_http(AuthorizedSession(creds, auth_request=Request(sessao_token)))
+
+    client = gspread.authorize(None, session=sessao)
+    client.set_timeout(float(config_sheets.get("timeout", 30)))
+
+    return client
+
+
+# Planilha aberta uma vez por processo. open_by_key faz uma requisição de metadados, que não precisa se repetir.
+@st.cache_resource(show_spinner=False)
+def abrir_planilha():
+    return conectar_google_sheets().open_by_key(sheet_id)
+
+
+
+# ##################################################################
+# CACHE DAS PLANILHAS
+# ##################################################################
+
+# Configurações do cache, lidas da seção [cache] do st.secrets (opcional)
+config_cache = st.secrets.get("cache", {})
+
+# Tempo, em segundos, que um snapshot de aba é considerado atualizado
+TTL_PLANILHAS = int(config_cache.get("ttl_planilhas", 300))
+
+# Se True, um snapshot vencido continua sendo servido enquanto a recarga roda em segundo plano
+SERVIR_EXPIRADO = bool(config_cache.get("servir_expirado", True))
+
+# De quanto em quanto tempo, em segundos, as abas são relidas por inteiro em vez de só as linhas novas
+# (para pegar edições em submissões antigas). 0 desliga a leitura incremental.
+RECONCILIAR_PLANILHAS_A_CADA = int(config_cache.get("reconciliar_a_cada", 3600))
+
+# Intervalo mínimo, em segundos, entre duas consultas à data de modificação da planilha no Drive.
+# Enquanto a planilha não for modificada, as recargas reaproveitam as abas já lidas. 0 desliga a consulta.
+VERIFICAR_MODIFICACAO_A_CADA = int(config_cache.get("verificar_modificacao_a_cada", 30))
+
+# Pasta onde fica a cópia em disco (Parquet) das abas, usada para servir as páginas logo que o processo começa.
+# Vazio desliga a cópia em disco. Como as abas têm CPFs, a pasta é criada com permissão 0700 e os arquivos
+# com 0600 (só o usuário que roda o app lê); fora do diretório do app, use um caminho que não seja compartilhado.
+DIRETORIO_ESPELHO = config_cache.get("diretorio_espelho", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".espelho_planilhas"))
+
+# Quantos itinerários/diárias já tratados ficam guardados para os diálogos de detalhes
+MAX_ITINERARIOS = int(config_cache.get("max_itinerarios", 1024))
+
+
+# Snapshots das abas do Google Sheets, compartilhados por todas as sessões do processo.
+# Cada aba tem a sua entrada, com os dados tratados, o momento da carga e um número de versão.
+# Só uma recarga por aba roda de cada vez (as outras sessões esperam por ela ou recebem o snapshot anterior).
+class CachePlanilhas:
+    def __init__(self, ttl, servir_expirado):
+        self.ttl = ttl
+        self.servir_expirado = servir_expirado
+        self._entradas = {}         # nome da aba -> {"dados", "carregado_em", "versao", "derivados"}
+        self._versoes = {}          # nome da aba -> última versão carregada (não volta a zero ao invalidar)
+        self._locks_abas = {}       # nome da aba -> lock da recarga
+        self._em_segundo_plano = set()
+        self._lock = threading.Lock()
+
+        # Consultas por aba: snapshot em dia, vencido mas servido assim mesmo, ou carregado na hora
+        self.acertos = 0
+        self.expirados = 0
+        self.falhas = 0
+
+    def _lock_da_aba(self, nome_aba):
+        with self._lock:
+            return self._locks_abas.setdefault(nome_aba, threading.Lock())
+
+    def _atualizada(self, entrada):
+        return entrada is not None and time.monotonic() - entrada["carregado_em"] < self.ttl
+
+    def _guardar(self, nome_aba, dados):
+        with self._lock:
+            versao = self._versoes.get(nome_aba, 0) + 1
+            self._versoes[nome_aba] = versao
+            # "derivados" guarda estruturas calculadas uma vez a partir deste snapshot (índices, mapas etc.)
+            entrada = {"dados": dados, "carregado_em": time.monotonic(), "versao": versao, "derivados": {}}
+            self._entradas[nome_aba] = entrada
+        return entrada
+
+    def _recarregar(self, nomes_abas, carregar_varias, forcar=False):
+        # Pega os locks sempre na mesma ordem, para não haver deadlock entre recargas de grupos diferentes
+        locks = [self._lock_da_aba(nome_aba) for nome_aba in sorted(nomes_abas)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            # Quem esperou no lock reaproveita o que a outra sessão acabou de carregar
+            entradas = {nome_aba: self._entradas.get(nome_aba) for nome_aba in nomes_abas}
+            pendentes = [nome_aba for nome_aba, entrada in entradas.items() if forcar or not self._atualizada(entrada)]
+            if pendentes:
+                dados = carregar_varias(pendentes)
+                for nome_aba in pendentes:
+                    anterior = entradas[nome_aba]
+                    if anterior is not None and dados[nome_aba] is anterior["dados"]:
+                        # A aba não mudou: renova o snapshot sem trocar a versão (os derivados continuam valendo)
+                        anterior["carregado_em"] = time.monotonic()
+                    else:
+                        entradas[nome_aba] = self._guardar(nome_aba, dados[nome_aba])
+            return entradas
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _recarregar_em_segundo_plano(self, nomes_abas, carregar_varias):
+        # Só dispara uma recarga por aba
+        with self._lock:
+            nomes_abas = [nome_aba for nome_aba in nomes_abas if nome_aba not in self._em_segundo_plano]
+            if not nomes_abas:
+                return
+            self._em_segundo_plano.update(nomes_abas)
+
+        def tarefa():
+            try:
+                self._recarregar(nomes_abas, carregar_varias)
+            except Exception:
+                # Se a recarga falhar, o snapshot anterior continua valendo
+                logger.exception("Erro ao recarregar as abas %s em segundo plano", nomes_abas)
+            finally:
+                with self._lock:
+                    self._em_segundo_plano.difference_update(nomes_abas)
+
+        threading.Thread(target=tarefa, name="recarga-planilhas", daemon=True).start()
+
+    # Devolve {nome da aba: snapshot}. As abas sem snapshot ou vencidas são carregadas juntas,
+    # numa só chamada de carregar_varias(lista de abas), que deve devolver {nome da aba: dados}.
+    def obter_snapshots(self, nomes_abas, carregar_varias):
+        entradas = {nome_aba: self._entradas.get(nome_aba) for nome_aba in nomes_abas}
+        vencidas = [nome_aba for nome_aba, entrada in entradas.items() if not self._atualizada(entrada)]
+        expiradas = []
+
+        # Stale-while-revalidate: devolve os snapshots vencidos e recarrega em segundo plano
+        if self.servir_expirado:
+            expiradas = [nome_aba for nome_aba in vencidas if entradas[nome_aba] is not None]
+            if expiradas:
+                self._recarregar_em_segundo_plano(expiradas, carregar_varias)
+            vencidas = [nome_aba for nome_aba in vencidas if entradas[nome_aba] is None]
+
+        with self._lock:
+            self.acertos += len(nomes_abas) - len(expiradas) - len(vencidas)
+            self.expirados += len(expiradas)
+            self.falhas += len(vencidas)
+
+        # Single-flight: quem chegar primeiro recarrega, os outros esperam e reaproveitam
+        if vencidas:
+            entradas.update(self._recarregar(vencidas, carregar_varias))
+
+        return entradas
+
+    # Recarrega as abas agora, mesmo que os snapshots estejam em dia, e devolve {nome da aba: snapshot}.
+    # carregar_varias roda com os locks das abas, sem outra recarga delas ao mesmo tempo.
+    # Enquanto isso, as sessões continuam recebendo os snapshots anteriores.
+    def recarregar(self, nomes_abas, carregar_varias):
+        return self._recarregar(nomes_abas, carregar_varias, forcar=True)
+
+    # Guarda um snapshot já vencido (lido do disco, por exemplo) para a aba que ainda não tem nenhum.
+    # Ele é servido enquanto a primeira recarga roda.
+    def semear(self, nome_aba, dados):
+        with self._lock:
+            if nome_aba in self._entradas:
+                return
+        entrada = self._guardar(nome_aba, dados)
+        entrada["carregado_em"] = float("-inf")
+
+    def versao(self, nome_aba):
+        entrada = self._entradas.get(nome_aba)
+        return entrada["versao"] if entrada else 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "acertos": self.acertos,
+                "expirados": self.expirados,
+                "falhas": self.falhas,
+                "abas": len(self._entradas),
+            }
+
+    # Descarta o snapshot de uma aba, ou de todas se nome_aba for None
+    def invalidar(self, nome_aba=None):
+        with self._lock:
+            if nome_aba is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(nome_aba, None)
+
+
+# Um único cache por processo, compartilhado entre as sessões
+@st.cache_resource(show_spinner=False)
+def obter_cache_planilhas():
+    cache = CachePlanilhas(TTL_PLANILHAS, SERVIR_EXPIRADO)
+    obter_metricas().observar_cache("planilhas", cache.estatisticas)
+    return cache
+
+
 
 # ##################################################################
 # FUNÇÕES AUXILIARES
@@ -100,10 +662,245 @@ def safe_get(dicionario, chave, default=""):
     return "" if pd.isna(valor) else valor
 
 
-# Função para enviar e-mail com código de verificação
-def enviar_email(destinatario, codigo):
+# Mantém apenas os números do CPF. É a chave usada nas buscas de usuário no banco.
+def normalizar_cpf(cpf):
+    return "".join(filter(str.isdigit, str(cpf or "")))
+
+
+# Normaliza um texto para a busca: minúsculas, sem acentos e com espaços simples
+def normalizar_busca(texto):
+    sem_acentos = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sem_acentos.lower().split())
+
+
+# Palavras do nome, normalizadas, guardadas no cadastro do viajante externo para a busca por nome
+def palavras_busca(nome):
+    return normalizar_busca(nome).split()
+
+
+# Configurações do servidor de e-mail, lidas da seção [smtp] do st.secrets (opcional).
+# Para testes, dá para apontar para um servidor SMTP local (ex.: aiosmtpd) com host, porta, ssl = false
+# e autenticar = false (sem isso o login é obrigatório e a conexão falha se o servidor não oferecer autenticação).
+config_smtp = st.secrets.get("smtp", {})
+
+
+# Conexões SMTP autenticadas e reaproveitadas entre os envios, compartilhadas entre as sessões.
+# Se uma conexão cair (o Gmail fecha as ociosas), ela é descartada e o envio é refeito numa conexão nova.
+# O número de envios por minuto é limitado, para não esbarrar no limite do Gmail nos picos de login.
+class PoolSMTP:
+    def __init__(self, host, porta, usar_ssl, usuario, senha, tamanho, envios_por_minuto, autenticar=True, timeout=20):
+        self.host = host
+        self.porta = porta
+        self.usar_ssl = usar_ssl
+        self.autenticar = autenticar
+        self.usuario = usuario
+        self.senha = senha
+        self.timeout = timeout
+        self._livres = queue.LifoQueue(maxsize=tamanho)
+
+        # Limite de envios: no máximo um envio a cada intervalo_minimo segundos
+        self.intervalo_minimo = 60 / envios_por_minuto if envios_por_minuto else 0
+        self._proximo_envio = 0.0
+        self._lock_ritmo = threading.Lock()
+
+    def _conectar(self):
+        if self.usar_ssl:
+            conexao = smtplib.SMTP_SSL(self.host, self.porta, timeout=self.timeout)
+        else:
+            conexao = smtplib.SMTP(self.host, self.porta, timeout=self.timeout)
+
+        try:
+            conexao.ehlo()
+            # Sem SSL, sobe para TLS antes de mandar a senha, se o servidor permitir
+            if not self.usar_ssl and conexao.has_extn("starttls"):
+                conexao.starttls()
+                conexao.ehlo()
+            if self.autenticar:
+                conexao.login(self.usuario, self.senha)
+        except Exception:
+            conexao.close()
+            raise
+        return conexao
+
+    def _pegar_conexao(self):
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            return self._conectar()
+
+    def _devolver_conexao(self, conexao):
+        try:
+            self._livres.put_nowait(conexao)
+        except queue.Full:
+            self._fechar(conexao)
+
+    def _fechar(self, conexao):
+        try:
+            conexao.quit()
+        except Exception:
+            conexao.close()
+
+    def _aguardar_vez(self):
+        # Reserva o próximo horário de envio livre e espera até ele
+        with self._lock_ritmo:
+            agora = time.monotonic()
+            horario = max(agora, self._proximo_envio)
+            self._proximo_envio = horario + self.intervalo_minimo
+        if horario > agora:
+            time.sleep(horario - agora)
+
+    # Envia a mensagem. Tenta de novo uma vez, numa conexão nova, se a conexão reaproveitada tiver caído.
+    def enviar(self, msg):
+        self._aguardar_vez()
+
+        for tentativa in range(2):
+            conexao = self._pegar_conexao()
+            try:
+                conexao.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+                # Conexão morta: descarta e tenta de novo numa nova
+                self._fechar(conexao)
+                if tentativa == 1:
+                    raise
+            except Exception:
+                self._fechar(conexao)
+                raise
+            else:
+                self._devolver_conexao(conexao)
+                return
+
+
+# Um único pool SMTP por processo
+@st.cache_resource(show_spinner=False)
+def obter_pool_smtp():
+    return PoolSMTP(
+        host=config_smtp.get("host", "smtp.gmail.com"),
+        porta=int(config_smtp.get("porta", 465)),
+        usar_ssl=bool(config_smtp.get("ssl", True)),
+        autenticar=bool(config_smtp.get("autenticar", True)),
+        usuario=st.secrets["senhas"]["endereco_email"],
+        senha=st.secrets["senhas"]["senha_email"],
+        tamanho=int(config_smtp.get("tamanho_pool", 3)),
+        envios_por_minuto=int(config_smtp.get("envios_por_minuto", 60)),
+    )
+
+
+# Fila de envio de e-mails processada em segundo plano, compartilhada entre as sessões.
+# A página de login só coloca o e-mail na fila e segue renderizando; os workers enviam pelo pool SMTP.
+# Cada envio é um dicionário de status que a sessão guarda e consulta nos reruns:
+# "na_fila" -> "enviando" -> "enviado", ou "aguardando" (entre tentativas) e, no fim, "falhou".
+# Falhas são tentadas de novo com espera exponencial, sem prender o worker durante a espera.
+class FilaEmails:
+    def __init__(self, enviar, workers=2, tentativas=4, espera_inicial=2.0, janela_latencias=500):
+        self._enviar = enviar
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+
+        # Métricas: envios concluídos, falhas definitivas e latências (fila -> entrega) mais recentes
+        self.enviados = 0
+        self.falhas = 0
+        self._latencias = deque(maxlen=janela_latencias)
+
+        for i in range(workers):
+            threading.Thread(target=self._trabalhar, name=f"fila-emails-{i}", daemon=True).start()
+
+    def enfileirar(self, msg):
+        envio = {
+            "status": "na_fila",
+            "tentativas": 0,
+            "erro": None,
+            "enfileirado_em": time.monotonic(),
+            "enviado_em": None,
+        }
+        self._fila.put((msg, envio))
+        return envio
+
+    def _trabalhar(self):
+        while True:
+            msg, envio = self._fila.get()
+            try:
+                self._processar(msg, envio)
+            finally:
+                self._fila.task_done()
+
+    def _processar(self, msg, envio):
+        envio["status"] = "enviando"
+        envio["tentativas"] += 1
+        try:
+            self._enviar(msg)
+        except Exception as e:
+            envio["erro"] = str(e)
+            if envio["tentativas"] >= self.tentativas:
+                envio["status"] = "falhou"
+                with self._lock:
+                    self.falhas += 1
+                logger.warning("Falha definitiva ao enviar e-mail para %s: %s", msg["To"], e)
+                return
+
+            # Reagenda a nova tentativa (2s, 4s, 8s...) sem ocupar o worker durante a espera
+            envio["status"] = "aguardando"
+            espera = self.espera_inicial * 2 ** (envio["tentativas"] - 1)
+            temporizador = threading.Timer(espera, self._fila.put, args=((msg, envio),))
+            temporizador.daemon = True
+            temporizador.start()
+            return
+
+        envio["enviado_em"] = time.monotonic()
+        envio["erro"] = None
+        envio["status"] = "enviado"
+        with self._lock:
+            self.enviados += 1
+            self._latencias.append(envio["enviado_em"] - envio["enfileirado_em"])
+
+    def metricas(self):
+        with self._lock:
+            latencias = sorted(self._latencias)
+            enviados, falhas = self.enviados, self.falhas
+
+        def percentil(p):
+            if not latencias:
+                return None
+            return latencias[min(len(latencias) - 1, int(p * len(latencias)))]
+
+        return {
+            "profundidade": self._fila.qsize(),
+            "enviados": enviados,
+            "falhas": falhas,
+            "latencia_p50": percentil(0.5),
+            "latencia_p95": percentil(0.95),
+        }
+
+
+# Uma única fila de envio (e seus workers) por processo
+@st.cache_resource(show_spinner=False)
+def obter_fila_emails():
+    pool = obter_pool_smtp()
+    metricas = obter_metricas()
+
+    # Cada tentativa de envio pelo pool é medida; a fila conta os envios concluídos e as falhas definitivas
+    def enviar(msg):
+        try:
+            with metricas.smtp_duracao.time():
+                pool.enviar(msg)
+        except Exception:
+            metricas.smtp_erros.inc()
+            raise
+
+    fila = FilaEmails(
+        enviar,
+        workers=int(config_smtp.get("workers", 2)),
+        tentativas=int(config_smtp.get("tentativas", 4)),
+        espera_inicial=float(config_smtp.get("espera_inicial", 2)),
+    )
+    metricas.observar_fila_emails(fila.metricas)
+    return fila
+
+
+# Função para montar o e-mail com código de verificação
+def montar_email_codigo(destinatario, codigo):
     remetente = st.secrets["senhas"]["endereco_email"]
-    senha = st.secrets["senhas"]["senha_email"]
 
     assunto = f"Código de Verificação: {codigo}"
 
@@ -122,23 +919,35 @@ def enviar_email(destinatario, codigo):
     msg["Subject"] = assunto
     msg["From"] = remetente
     msg["To"] = destinatario
+    return msg
 
-    # Tenta enviar o e-mail com o código de verificação
-    try:
-        # Conecta ao servidor de e-mail do Gmail
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            # Faz login com o e-mail e senha do remetente
-            server.login(remetente, senha)
-            # Envia o e-mail
-            server.sendmail(remetente, destinatario, msg.as_string())
-        # Se der certo, retorna True
-        return True
-    except Exception as e:
-        # Se der errado, exibe o erro e retorna False
-        st.error(f"Erro ao enviar e-mail: {e}")
-        return False
+
+# Função para enviar e-mail com código de verificação
+# Não espera o envio: coloca o e-mail na fila e retorna o dicionário de status do envio
+def enviar_email(destinatario, codigo):
+    return obter_fila_emails().enfileirar(montar_email_codigo(destinatario, codigo))
+
+
+
+# Formata uma data no formato brasileiro (DD/MM/YYYY), só na hora de mostrar. Data vazia (NaT) vira "".
+def formatar_data(data):
+    return "" if pd.isna(data) else data.strftime("%d/%m/%Y")
 
 
+# Formata as colunas de data de um DataFrame (uma página da lista, por exemplo) no formato brasileiro
+def formatar_datas(df):
+    df = df.copy()
+    for coluna in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[coluna]):
+            df[coluna] = df[coluna].dt.strftime("%d/%m/%Y").fillna("")
+    return df
+
+
+# Escapa o $ para que o Streamlit não o trate como início de fórmula no markdown.
+# Usada só nos valores da planilha mostrados com st.write; os DataFrames guardam o texto original.
+def escapar_markdown(valor):
+    return str(valor).replace("$", "\\$")
+
 
 # Função para transformar o itinerário em uma lista de dicionários
 def parse_itinerario(itinerario_texto):
@@ -185,31 +994,143 @@ def parse_diarias(diarias_texto):
     return diarias
 
 
+# Valor de um campo em cada trecho do itinerário. Segue a mesma regra do parse_itinerario:
+# campos separados por ", ", chave e valor separados por ": ", um trecho por linha.
+def padrao_campo_itinerario(campo):
+    return re.compile(rf"(?:^|, )[ \t]*{re.escape(campo)}: (?P<valor>.*?)[ \t]*(?=, |\r?$)", re.MULTILINE)
 
-# Função para mostrar os detalhes da SAV no diálogo
-@st.dialog("Detalhes da Viagem", width='large')
-def mostrar_detalhes_sav(row):
 
-    # TRATAMENTO DO ITINERÁRIO
+PADRAO_DATA_TRECHO = padrao_campo_itinerario("Data")
+PADRAO_CIDADE_CHEGADA = padrao_campo_itinerario("Cidade de chegada")
+
+
+# Converte as datas do itinerário (texto) em datetime. O JotForm grava DD-MM-YYYY, que é convertido de uma vez só;
+# o que sobrar (datas digitadas com "/", ano com dois dígitos etc.) passa por uma conversão tolerante, dia primeiro,
+# como era feito antes. As datas que nem assim forem entendidas ficam NaT e vão para o log.
+def converter_datas_itinerario(textos, codigos):
+    datas = pd.to_datetime(textos, format="%d-%m-%Y", errors="coerce")
+
+    restantes = datas.isna() & textos.notna() & (textos.fillna("").str.strip() != "")
+    if restantes.any():
+        datas[restantes] = pd.to_datetime(textos[restantes], format="mixed", dayfirst=True, errors="coerce")
+
+        invalidas = restantes & datas.isna()
+        if invalidas.any():
+            logger.warning(
+                "Datas do itinerário não reconhecidas em %d SAV(s): %s",
+                invalidas.sum(),
+                ", ".join(f"{codigo} ({texto})" for codigo, texto in zip(codigos[invalidas], textos[invalidas])),
+            )
+
+    return datas
+
+
+# Acrescenta ao DataFrame de SAVs as colunas tiradas do itinerário, numa só passada vetorizada para todas as linhas:
+# data inicial, data final (datetime), destinos e número de trechos
+def adicionar_colunas_itinerario(df_savs):
+    itinerarios = df_savs["Itinerário:"].fillna("").astype(str)
+
+    # Uma linha por trecho encontrado, com o índice (linha da SAV, número do trecho)
+    datas = itinerarios.str.extractall(PADRAO_DATA_TRECHO)["valor"].groupby(level=0)
+    cidades = itinerarios.str.extractall(PADRAO_CIDADE_CHEGADA)["valor"].groupby(level=0)
+
+    # Primeira e última data do itinerário. Sem data válida, fica NaT.
+    codigos = df_savs["Código da viagem:"].astype(str)
+    df_savs["Data inicial:"] = converter_datas_itinerario(datas.first().reindex(df_savs.index), codigos)
+    df_savs["Data final:"] = converter_datas_itinerario(datas.last().reindex(df_savs.index), codigos)
+
+    # Cidades de chegada: com " > " para mostrar na lista e com ", " para o formulário do relatório
+    df_savs["Destinos:"] = cidades.agg(" > ".join).reindex(df_savs.index).fillna("")
+    df_savs["Cidades de chegada:"] = cidades.agg(", ".join).reindex(df_savs.index).fillna("")
+
+    # Número de trechos (linhas preenchidas do itinerário)
+    df_savs["Número de trechos:"] = itinerarios.str.count(r"(?m)^[ \t]*\S")
+
+    return df_savs
+
+
+# LRU de itinerários e diárias já tratados, compartilhado entre as sessões.
+# A chave é (Submission ID, hash do conteúdo): se a SAV for editada no JotForm, o hash muda e a entrada antiga
+# deixa de ser usada. Os contadores de acertos e falhas servem para dimensionar o tamanho máximo.
+class CacheItinerarios:
+    def __init__(self, tamanho_maximo):
+        self._itens = LRUCache(maxsize=tamanho_maximo)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    # Devolve (df_trechos, df_diarias) da SAV. Os DataFrames são compartilhados: não devem ser alterados.
+    def obter(self, submission_id, itinerario_texto, diarias_texto):
+        conteudo = f"{itinerario_texto}\0{diarias_texto}".encode("utf-8")
+        chave = (submission_id, hashlib.sha1(conteudo).hexdigest())
+
+        with self._lock:
+            tratado = self._itens.get(chave)
+            if tratado is not None:
+                self.acertos += 1
+                return tratado
+            self.falhas += 1
+
+        tratado = (tratar_trechos(itinerario_texto), tratar_diarias(diarias_texto))
+
+        with self._lock:
+            self._itens[chave] = tratado
+        return tratado
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / total if total else 0.0,
+                "tamanho": len(self._itens),
+                "tamanho_maximo": self._itens.maxsize,
+            }
+
+
+# Um único cache de itinerários por processo
+@st.cache_resource(show_spinner=False)
+def obter_cache_itinerarios():
+    cache = CacheItinerarios(MAX_ITINERARIOS)
+    obter_metricas().observar_cache("itinerarios", cache.estatisticas)
+    return cache
+
+
+# Transforma o texto do itinerário no DataFrame de trechos mostrado nos detalhes da SAV
+def tratar_trechos(itinerario_texto):
     # Transformar o itinerário em uma lista de dicionários
-    viagens = parse_itinerario(row["Itinerário:"])
+    viagens = parse_itinerario(itinerario_texto)
     # Criar um DataFrame a partir do dicionário
     df_trechos = pd.DataFrame(viagens)
     # Substituir os campos com None por ""
     df_trechos.fillna("", inplace=True)
     # Renomear colunas
     df_trechos.rename(columns={"Tipo de transporte": "Transporte", "Horário de preferência": "Horário"}, inplace=True)
+    return df_trechos
+
+
+# Transforma o texto das diárias no DataFrame mostrado nos detalhes da SAV
+def tratar_diarias(diarias_texto):
+    # Transformar as diárias em uma lista de dicionários
+    diarias = parse_diarias(diarias_texto)
+    # Criar um DataFrame a partir da lista de dicionários
+    df_diarias = pd.DataFrame(diarias)
+    # Substituir os campos com None por ""
+    df_diarias.fillna("", inplace=True)
+    return df_diarias
 
 
-# !!!!!!!!!!!!!!!!!!!!!!
-    if st.session_state.tipo_usuario == "interno":
-        # TRATAMENTO DAS DIÁRIAS
-        # Transformar as diárias em uma lista de dicionários
-        diarias = parse_diarias(row["Diárias"])
-        # Criar um DataFrame a partir da lista de dicionários
-        df_diarias = pd.DataFrame(diarias)
-        # Substituir os campos com None por ""
-        df_diarias.fillna("", inplace=True)
+
+# Função para mostrar os detalhes da SAV no diálogo
+@st.dialog("Detalhes da Viagem", width='large')
+def mostrar_detalhes_sav(row):
+
+    # TRATAMENTO DO ITINERÁRIO E DAS DIÁRIAS
+    # Vêm do cache de itinerários, que só trata de novo se a SAV for nova ou tiver sido editada
+    df_trechos, df_diarias = obter_cache_itinerarios().obter(
+        row["Submission ID"], row["Itinerário:"], row.get("Diárias", "")
+    )
 
 
     # TRATAMENTO DO LINK DE EDIÇÃO
@@ -232,17 +1153,17 @@ def mostrar_detalhes_sav(row):
     # INFORMAÇÕES
     # Se a SAV for para terceiros, mostra o nome do viajante
     if row["Código da viagem:"].startswith("TRC"):
-        st.write(f"**Nome do(a) viajante:** {row['Nome do(a) viajante:']}")
-    st.write(f"**Código da viagem:** {row['Código da viagem:']}")
-    st.write(f"**Data da solicitação:** {row['Submission Date']}")
-    st.write(f"**Objetivo:** {row['Descrição do objetivo da viagem:']}")
-    st.write(f"**Fonte de recurso:** {row['Qual é a fonte do recurso?']}")
+        st.write(f"**Nome do(a) viajante:** {escapar_markdown(row['Nome do(a) viajante:'])}")
+    st.write(f"**Código da viagem:** {escapar_markdown(row['Código da viagem:'])}")
+    st.write(f"**Data da solicitação:** {formatar_data(row['Submission Date'])}")
+    st.write(f"**Objetivo:** {escapar_markdown(row['Descrição do objetivo da viagem:'])}")
+    st.write(f"**Fonte de recurso:** {escapar_markdown(row['Qual é a fonte do recurso?'])}")
 
 # !!!!!!!!!!!!!!!!!!!!!!
     # Só externo
     if st.session_state.tipo_usuario == "externo":
         # Ponto focal
-        st.write(f"**Ponto focal:** {row['Ponto focal:']}")
+        st.write(f"**Ponto focal:** {escapar_markdown(row['Ponto focal:'])}")
 
 
     # Exibir os detalhes do itinerário como tabela
@@ -256,43 +1177,42 @@ def mostrar_detalhes_sav(row):
         st.write("**Diárias:**")
         st.dataframe(df_diarias, use_container_width=False, hide_index=True)
 
-        st.write(f"**Custo pago pelo anfitrião:** {row['A viagem tem algum custo pago pelo anfitrião?']}")
+        st.write(f"**Custo pago pelo anfitrião:** {escapar_markdown(row['A viagem tem algum custo pago pelo anfitrião?'])}")
     
 
-    st.write(f"**Será necessário um veículo?** {row['Será necessário locação de veículo?']}")
+    st.write(f"**Será necessário um veículo?** {escapar_markdown(row['Será necessário locação de veículo?'])}")
 
     # Container para botar uma borda em torno das informações do veículo alugado ou do ISPN
     veiculo = st.container(border=True)
 
     if row.get('Um veículo alugado ou um veículo do ISPN em Santa Inês?'):
-        veiculo.write(row['Um veículo alugado ou um veículo do ISPN em Santa Inês?'])
+        veiculo.write(escapar_markdown(row['Um veículo alugado ou um veículo do ISPN em Santa Inês?']))
 
 
     # VEÍCULO ALUGADO
     if row.get('Descreva o tipo de veículo desejado:'):
-        veiculo.write(row['Descreva o tipo de veículo desejado:'])
+        veiculo.write(escapar_markdown(row['Descreva o tipo de veículo desejado:']))
 
     if row.get('Detalhe os locais e horários de retirada e retorno do veículo alugado:'):
-        veiculo.write(row['Detalhe os locais e horários de retirada e retorno do veículo alugado:'])
+        veiculo.write(escapar_markdown(row['Detalhe os locais e horários de retirada e retorno do veículo alugado:']))
 
     # VEÍCULO DO ISPN
     if row.get('Escolha o veículo:'):
-        veiculo.write(row['Escolha o veículo:'])
+        veiculo.write(escapar_markdown(row['Escolha o veículo:']))
 
     if row.get('Quais são os horários previstos de retirada e retorno do veículo?'):
-        veiculo.write(row['Quais são os horários previstos de retirada e retorno do veículo?'])
+        veiculo.write(escapar_markdown(row['Quais são os horários previstos de retirada e retorno do veículo?']))
 
 
-    st.write(f"**Observações:** {row['Observações gerais:']}")
+    st.write(f"**Observações:** {escapar_markdown(row['Observações gerais:'])}")
 
     st.write('')
 
 
 @st.dialog("Detalhes do Relatório", width='large')
-def mostrar_detalhes_rvs(row, df_rvss):
+def mostrar_detalhes_rvs(row, relatorio):
 
-    # Selecionando o relatório a partir do código da SAV
-    relatorio = df_rvss[df_rvss["Código da viagem:"].str.upper() == row["Código da viagem:"].upper()].iloc[0]
+    # O relatório chega já selecionado pelo código da SAV (ver buscar_relatorio)
 
     # TRATAMENTO DO LINK DE EDIÇÃO
     sumbission_id = relatorio["Submission ID"]
@@ -305,36 +1225,36 @@ def mostrar_detalhes_rvs(row, df_rvss):
 
     # INFORMAÇÕES
     if row["Código da viagem:"].startswith("TRC"):
-        st.write(f"**Nome do(a) viajante:** {row['Nome do(a) viajante:']}")
-    st.write(f"**Código da viagem:** {row['Código da viagem:']}")   # Pega o código direto da SAV
-    st.write(f"**Data do envio do relatório:** {relatorio['Submission Date']}")
-    st.write(f"**Fonte de recurso:** {relatorio['Qual é a fonte do recurso?']}")
-    st.write(f"**Período da viagem:** {relatorio['Período da viagem:']}")
-    st.write(f"**Cidade(s) de destino:** {relatorio['Cidade(s) de destino:']}")
+        st.write(f"**Nome do(a) viajante:** {escapar_markdown(row['Nome do(a) viajante:'])}")
+    st.write(f"**Código da viagem:** {escapar_markdown(row['Código da viagem:'])}")   # Pega o código direto da SAV
+    st.write(f"**Data do envio do relatório:** {formatar_data(relatorio['Submission Date'])}")
+    st.write(f"**Fonte de recurso:** {escapar_markdown(relatorio['Qual é a fonte do recurso?'])}")
+    st.write(f"**Período da viagem:** {escapar_markdown(relatorio['Período da viagem:'])}")
+    st.write(f"**Cidade(s) de destino:** {escapar_markdown(relatorio['Cidade(s) de destino:'])}")
 
 # !!!!!!!!!!!!!!!!!!!
     if st.session_state.tipo_usuario == "interno":
         
         try: # Não tem no relatório de terceiros.
-            st.write(f"**Modalidade:** {relatorio['Modalidade:']}")
+            st.write(f"**Modalidade:** {escapar_markdown(relatorio['Modalidade:'])}")
         except:
             pass
 
         try: # Não tem no relatório de terceiros.
-            st.write(f"**Modo de transporte até o destino:** {relatorio['Modo de transporte até o destino:']}")
+            st.write(f"**Modo de transporte até o destino:** {escapar_markdown(relatorio['Modo de transporte até o destino:'])}")
         except:
             pass
 
         try: # Não tem no relatório de terceiros.
-            st.write(f"**Despesas cobertas pelo anfitrião (descrição e valor):** {relatorio['Despesas cobertas pelo anfitrião (descrição e valor):']}")
+            st.write(f"**Despesas cobertas pelo anfitrião (descrição e valor):** {escapar_markdown(relatorio['Despesas cobertas pelo anfitrião (descrição e valor):'])}")
         except:
             pass
 
-    st.write(f"**Número de pernoites:** {relatorio['Número de pernoites:']}")
-    st.write(f"**Valor das diárias recebidas:** {relatorio['Valor das diárias recebidas (R$):']}")
-    st.write(f"**Valor gasto com transporte no destino:** {relatorio['Valor gasto com transporte no destino (R$):']}")
-    st.write(f"**Atividades realizadas na viagem:** {relatorio['Descreva as atividades realizadas na viagem:']}")
-    st.write(f"**Principais Resultados / Produtos:** {relatorio['Principais Resultados / Produtos:']}")
+    st.write(f"**Número de pernoites:** {escapar_markdown(relatorio['Número de pernoites:'])}")
+    st.write(f"**Valor das diárias recebidas:** {escapar_markdown(relatorio['Valor das diárias recebidas (R$):'])}")
+    st.write(f"**Valor gasto com transporte no destino:** {escapar_markdown(relatorio['Valor gasto com transporte no destino (R$):'])}")
+    st.write(f"**Atividades realizadas na viagem:** {escapar_markdown(relatorio['Descreva as atividades realizadas na viagem:'])}")
+    st.write(f"**Principais Resultados / Produtos:** {escapar_markdown(relatorio['Principais Resultados / Produtos:'])}")
 
     # Fotos
     st.write("**Fotos da viagem:**")
@@ -356,72 +1276,70 @@ def mostrar_detalhes_rvs(row, df_rvss):
         # Obtém o nome do arquivo
         nome_arquivo = url.split("/")[-1]  
         # Mostra o link na página
-        st.markdown(f'<a href="{url}" target="_blank">{nome_arquivo}</a><br>', unsafe_allow_html=True)
+        st.markdown(f'<a href="{url}" target="_blank">{escapar_markdown(nome_arquivo)}</a><br>', unsafe_allow_html=True)
        
-    st.write(f"**Observações:** {relatorio['Observações gerais:']}")
+    st.write(f"**Observações:** {escapar_markdown(relatorio['Observações gerais:'])}")
 
     st.write('')
 
 
 
 
-# Carregar usuários internos no banco de dados ------------------------------
-def carregar_internos():
-    
-    # criar um dataframe com os usuários internos
-    df_usuarios_internos = pd.DataFrame(list(banco_de_dados["usuarios_internos"].find()))
-    
-    # Considerar apenas os números da coluna cpf
-    df_usuarios_internos["cpf"] = df_usuarios_internos["cpf"].astype(str).str.replace(r"\D", "", regex=True)
+# Buscar viajantes externos pelo nome ------------------------------
+# Cada palavra digitada tem que ser o começo de uma palavra do nome, sem diferenciar acentos e maiúsculas
+# ("ana li" encontra "Ana Lima" e "Lívia Ana Souza", mas não "Luciana Silva"). Devolve no máximo `limite` viajantes, só com _id, nome e CPF.
+def buscar_externos(texto, limite=10):
+    termos = normalizar_busca(texto).split()
+    if not termos:
+        return []
 
-    return df_usuarios_internos
+    garantir_indice_busca_externos()
 
+    filtro = {"$and": [{"palavras_busca": re.compile("^" + re.escape(termo))} for termo in termos]}
+    cursor = banco_de_dados["usuarios_externos"].find(filtro, {"nome_completo": 1, "cpf": 1})
 
-# Cerregar usuários externos no banco de dados ------------------------------
-def carregar_externos():
-    # criar um dataframe com os usuários internos
-    df_usuarios_externos = pd.DataFrame(list(banco_de_dados["usuarios_externos"].find()))
-    
-    # Considerar apenas os números da coluna cpf
-    df_usuarios_externos["cpf"] = df_usuarios_externos["cpf"].astype(str).str.replace(r"\D", "", regex=True)
+    return list(cursor.sort("nome_completo", 1).limit(limite))
 
-    return df_usuarios_externos
 
+# Carregar um viajante externo pelo _id ------------------------------
+def carregar_externo(id_externo):
+    viajante = banco_de_dados["usuarios_externos"].find_one({"_id": id_externo})
 
-# Carregar SAVs internas no google sheets ------------------------------
-# @st.cache_data(show_spinner=False)
-def carregar_savs_int():
+    # Considerar apenas os números do cpf
+    if viajante is not None:
+        viajante["cpf"] = normalizar_cpf(viajante.get("cpf"))
 
-    sheet = client.open_by_key(sheet_id)
-    
-    values_savs = sheet.worksheet("SAVs INTERNAS Portal").get_all_values()
-    # values_savs = sheet.worksheet("TESTE RENATO SAVs").get_all_values()
-    # values_savs = sheet.worksheet("Recebimento de SAVs").get_all_values()
+    return viajante
+
+
+# Nome do viajante com parte do CPF, para diferenciar pessoas com o mesmo nome na lista
+def rotulo_externo(viajante):
+    cpf = normalizar_cpf(viajante.get("cpf"))
+    if len(cpf) != 11:
+        return viajante.get("nome_completo", "")
+    return f"{viajante.get('nome_completo', '')} (CPF ***.{cpf[3:6]}.{cpf[6:9]}-**)"
+
+
+# Tratar SAVs internas lidas do google sheets ------------------------------
+def tratar_savs_int(values_savs):
 
     # Criar DataFrame de SAVs. A primeira linha é usada como cabeçalho
     df_savs = pd.DataFrame(values_savs[1:], columns=values_savs[0])
 
     # Converter as colunas de data para datetime
-    df_savs["Submission Date"] = pd.to_datetime(df_savs["Submission Date"])  # Garantir que é datetime
-    df_savs["Submission Date"] = df_savs["Submission Date"].dt.strftime("%d/%m/%Y")  # Converter para string no formato brasileiro
+    df_savs["Submission Date"] = pd.to_datetime(df_savs["Submission Date"])  # Fica como datetime; é formatada só na hora de mostrar
 
     # Filtar SAVs com o prefixo "SAV-"
     df_savs = df_savs[df_savs['Código da viagem:'].str.upper().str.startswith('SAV-')]
 
-    df_savs = df_savs.replace({r'\$': r'\\$'}, regex=True)
-
+    # Datas e destinos tirados do itinerário, calculados uma vez por snapshot
+    df_savs = adicionar_colunas_itinerario(df_savs)
 
     return df_savs
 
 
-# Carregar RVSs internos no google sheets ------------------------------
-# @st.cache_data(show_spinner=False)
-def carregar_rvss_int():
-
-    sheet = client.open_by_key(sheet_id)
-
-    # Planilha de recebimento de RVSs internos
-    values_rvss = sheet.worksheet("RVSs INTERNOS Portal").get_all_values()
+# Tratar RVSs internos lidos do google sheets ------------------------------
+def tratar_rvss_int(values_rvss):
 
     # Criar DataFrame de RVSs. A primeira linha é usada como cabeçalho
     df_rvss = pd.DataFrame(values_rvss[1:], columns=values_rvss[0])
@@ -430,54 +1348,35 @@ def carregar_rvss_int():
     df_rvss = df_rvss[df_rvss['Código da viagem:'].str.upper().str.startswith('SAV-')]
 
     # Converter as colunas de data para datetime
-    df_rvss["Submission Date"] = pd.to_datetime(df_rvss["Submission Date"])  # Garantir que é datetime
-    df_rvss["Submission Date"] = df_rvss["Submission Date"].dt.strftime("%d/%m/%Y")  # Converter para string no formato brasileiro
-
-    df_rvss = df_rvss.replace({r'\$': r'\\$'}, regex=True)
+    df_rvss["Submission Date"] = pd.to_datetime(df_rvss["Submission Date"])  # Fica como datetime; é formatada só na hora de mostrar
 
     return df_rvss
 
 
-# Carregar SAVs externas no google sheets ------------------------------
-# @st.cache_data(show_spinner=False)
-def carregar_savs_ext():
-
-    # Abrir a planilha de SAVs externas
-    sheet = client.open_by_key(sheet_id)
-
-    # Ler todos os valores da planilha
-    values_savs = sheet.worksheet("SAVs EXTERNAS Portal").get_all_values()
+# Tratar SAVs externas lidas do google sheets ------------------------------
+def tratar_savs_ext(values_savs):
 
     # Criar DataFrame de SAVs. A primeira linha é usada como cabeçalho
     df_savs = pd.DataFrame(values_savs[1:], columns=values_savs[0])
 
     # Converter as colunas de data para datetime
-    df_savs["Submission Date"] = pd.to_datetime(df_savs["Submission Date"])  # Garantir que é datetime
-    df_savs["Submission Date"] = df_savs["Submission Date"].dt.strftime("%d/%m/%Y")  # Converter para string no formato brasileiro
+    df_savs["Submission Date"] = pd.to_datetime(df_savs["Submission Date"])  # Fica como datetime; é formatada só na hora de mostrar
 
     # Filtar SAVs com o prefixo "EXT-"
     df_savs = df_savs[df_savs['Código da viagem:'].str.upper().str.startswith('EXT-')]
-   
-    # Substitui o caractere $ por \$ para que o Streamlit possa exibir corretamente
-    df_savs = df_savs.replace({r'\$': r'\\$'}, regex=True)
 
     # Renomeia as colunas para que tenham nomes mais legíveis
     df_savs.rename(columns={'Insira aqui os seus deslocamentos. Cada trecho em uma nova linha:': 'Itinerário:',
                             'Nome do ponto focal no ISPN (a pessoa que está convidando)': 'Ponto focal:'}, inplace=True)
 
-    return df_savs
-
+    # Datas e destinos tirados do itinerário, calculados uma vez por snapshot
+    df_savs = adicionar_colunas_itinerario(df_savs)
 
-# Carregar RVSs externos no google sheets ------------------------------
-# @st.cache_data(show_spinner=False)
-def carregar_rvss_ext():
+    return df_savs
 
-    # Abrir a planilha de RVSs externas
-    sheet = client.open_by_key(sheet_id)
 
-    # Ler todos os valores da planilha
-    # values_rvss = sheet.worksheet("TESTE RENATO SAVs").get_all_values()
-    values_rvss = sheet.worksheet("RVSs EXTERNOS Portal").get_all_values()
+# Tratar RVSs externos lidos do google sheets ------------------------------
+def tratar_rvss_ext(values_rvss):
 
     # Criar DataFrame de RVSs. A primeira linha é usada como cabeçalho
     df_rvss = pd.DataFrame(values_rvss[1:], columns=values_rvss[0])
@@ -486,53 +1385,34 @@ def carregar_rvss_ext():
     df_rvss = df_rvss[df_rvss['Código da viagem:'].str.upper().str.startswith('EXT-')]
 
     # Converter as colunas de data para datetime
-    df_rvss["Submission Date"] = pd.to_datetime(df_rvss["Submission Date"])  # Garantir que é datetime
-    df_rvss["Submission Date"] = df_rvss["Submission Date"].dt.strftime("%d/%m/%Y")  # Converter para string no formato brasileiro
-
-    df_rvss = df_rvss.replace({r'\$': r'\\$'}, regex=True)
+    df_rvss["Submission Date"] = pd.to_datetime(df_rvss["Submission Date"])  # Fica como datetime; é formatada só na hora de mostrar
 
     return df_rvss
 
 
-# Carregar SAVs de terceiros no google sheets ------------------------------
-# @st.cache_data(show_spinner=False)
-def carregar_savs_trc():
-
-    # Abrir a planilha de SAVs de terceiros
-    sheet = client.open_by_key(sheet_id)
-
-    # Ler todos os valores da planilha
-    values_savs = sheet.worksheet("SAVs TERCEIROS Portal").get_all_values()
+# Tratar SAVs de terceiros lidas do google sheets ------------------------------
+def tratar_savs_trc(values_savs):
 
     # Criar DataFrame de SAVs. A primeira linha é usada como cabeçalho
     df_savs = pd.DataFrame(values_savs[1:], columns=values_savs[0])
 
     # Converter as colunas de data para datetime
-    df_savs["Submission Date"] = pd.to_datetime(df_savs["Submission Date"])  # Garantir que é datetime
-    df_savs["Submission Date"] = df_savs["Submission Date"].dt.strftime("%d/%m/%Y")  # Converter para string no formato brasileiro
+    df_savs["Submission Date"] = pd.to_datetime(df_savs["Submission Date"])  # Fica como datetime; é formatada só na hora de mostrar
 
     # Filtar SAVs com o prefixo "TRC-"
     df_savs = df_savs[df_savs['Código da viagem:'].str.upper().str.startswith('TRC-')]
-   
-    # Substitui o caractere $ por \$ para que o Streamlit possa exibir corretamente
-    df_savs = df_savs.replace({r'\$': r'\\$'}, regex=True)
 
     # Renomeia as colunas para que tenham nomes mais legíveis
     df_savs.rename(columns={'Insira aqui os deslocamentos considerando IDA e VOLTA. Cada trecho em uma nova linha:': 'Itinerário:'}, inplace=True)
 
-    return df_savs
+    # Datas e destinos tirados do itinerário, calculados uma vez por snapshot
+    df_savs = adicionar_colunas_itinerario(df_savs)
 
+    return df_savs
 
-# Carregar RVSs externos no google sheets ------------------------------
-# @st.cache_data(show_spinner=False)
-def carregar_rvss_trc():
-
-    # Abrir a planilha de RVSs externas
-    sheet = client.open_by_key(sheet_id)
 
-    # Ler todos os valores da planilha
-    # values_rvss = sheet.worksheet("TESTE RENATO SAVs").get_all_values()
-    values_rvss = sheet.worksheet("RVSs TERCEIROS Portal").get_all_values()
+# Tratar RVSs de terceiros lidos do google sheets ------------------------------
+def tratar_rvss_trc(values_rvss):
 
     # Criar DataFrame de RVSs. A primeira linha é usada como cabeçalho
     df_rvss_terceiros = pd.DataFrame(values_rvss[1:], columns=values_rvss[0])
@@ -541,14 +1421,697 @@ def carregar_rvss_trc():
     df_rvss_terceiros = df_rvss_terceiros[df_rvss_terceiros['Código da viagem:'].str.upper().str.startswith('TRC-')]
 
     # Converter as colunas de data para datetime
-    df_rvss_terceiros["Submission Date"] = pd.to_datetime(df_rvss_terceiros["Submission Date"])  # Garantir que é datetime
-    df_rvss_terceiros["Submission Date"] = df_rvss_terceiros["Submission Date"].dt.strftime("%d/%m/%Y")  # Converter para string no formato brasileiro
-
-    df_rvss_terceiros = df_rvss_terceiros.replace({r'\$': r'\\$'}, regex=True)
+    df_rvss_terceiros["Submission Date"] = pd.to_datetime(df_rvss_terceiros["Submission Date"])  # Fica como datetime; é formatada só na hora de mostrar
 
     return df_rvss_terceiros
 
 
+# Função de tratamento de cada aba, pelo nome da aba na planilha
+TRATAMENTOS_ABAS = {
+    "SAVs INTERNAS Portal": tratar_savs_int,
+    "RVSs INTERNOS Portal": tratar_rvss_int,
+    "SAVs EXTERNAS Portal": tratar_savs_ext,
+    "RVSs EXTERNOS Portal": tratar_rvss_ext,
+    "SAVs TERCEIROS Portal": tratar_savs_trc,
+    "RVSs TERCEIROS Portal": tratar_rvss_trc,
+}
+
+
+# Abas da planilha (SAVs, RVSs) com as viagens do próprio usuário, por tipo de usuário
+ABAS_POR_TIPO_USUARIO = {
+    "interno": ["SAVs INTERNAS Portal", "RVSs INTERNOS Portal"],
+    "externo": ["SAVs EXTERNAS Portal", "RVSs EXTERNOS Portal"],
+}
+
+# Abas da planilha (SAVs, RVSs) das viagens de terceiros, só para usuários internos
+ABAS_TERCEIROS = ["SAVs TERCEIROS Portal", "RVSs TERCEIROS Portal"]
+
+
+# Lê vários intervalos (notação A1, com o nome da aba) da planilha numa única requisição (values_batch_get).
+# Devolve a lista de valores de cada intervalo, na mesma ordem.
+def ler_intervalos(intervalos):
+    sheet = abrir_planilha()
+
+    metricas = obter_metricas()
+    try:
+        with metricas.sheets_duracao.labels("values_batch_get").time():
+            resposta = sheet.values_batch_get(intervalos)
+    except Exception:
+        metricas.sheets_erros.labels("values_batch_get").inc()
+        raise
+
+    return [intervalo.get("values", []) for intervalo in resposta["valueRanges"]]
+
+
+# Data de modificação da planilha (modifiedTime do Drive). É uma requisição pequena, sem os dados das abas.
+def consultar_modificacao_planilha():
+    sheet = abrir_planilha()
+
+    metricas = obter_metricas()
+    try:
+        with metricas.sheets_duracao.labels("get_lastUpdateTime").time():
+            return sheet.get_lastUpdateTime()
+    except Exception:
+        metricas.sheets_erros.labels("get_lastUpdateTime").inc()
+        raise
+
+
+# Completa uma linha lida da API com células vazias até a largura do cabeçalho
+def completar_linha(linha, largura):
+    return linha + [""] * (largura - len(linha))
+
+
+# Versão do formato da cópia em disco. Deve mudar sempre que o tratamento das abas (as colunas dos
+# DataFrames) mudar, para que cópias antigas sejam ignoradas.
+VERSAO_ESPELHO = 3
+
+
+# Cópia em disco, em Parquet, do DataFrame tratado de cada aba e do estado da sua sincronização.
+# É regravada depois de cada sincronização que muda a aba e lida quando o processo começa, para que as
+# primeiras páginas sejam servidas do disco enquanto as abas são atualizadas em segundo plano.
+class EspelhoParquet:
+    CHAVE_METADADOS = b"portal_savs"
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        # Os arquivos têm CPFs e e-mails: a pasta é só do usuário do processo, mesmo se já existia
+        os.makedirs(diretorio, mode=0o700, exist_ok=True)
+        os.chmod(diretorio, 0o700)
+
+    def _caminho(self, nome_aba):
+        return os.path.join(self.diretorio, re.sub(r"\W+", "_", nome_aba) + ".parquet")
+
+    def salvar(self, nome_aba, dados, estado):
+        tabela = pa.Table.from_pandas(dados, preserve_index=True)
+        metadados = dict(tabela.schema.metadata or {})
+        metadados[self.CHAVE_METADADOS] = json.dumps({"versao": VERSAO_ESPELHO, **estado}).encode()
+        tabela = tabela.replace_schema_metadata(metadados)
+
+        # Grava num arquivo temporário e troca de uma vez, para nunca deixar um arquivo pela metade
+        caminho = self._caminho(nome_aba)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, "wb", opener=lambda caminho, flags: os.open(caminho, flags, 0o600)) as arquivo:
+            pq.write_table(tabela, arquivo)
+        os.replace(temporario, caminho)
+
+    # Devolve (DataFrame, estado) da aba, ou None se não houver cópia válida em disco
+    def carregar(self, nome_aba):
+        try:
+            tabela = pq.read_table(self._caminho(nome_aba))
+            estado = json.loads(tabela.schema.metadata[self.CHAVE_METADADOS])
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError, pa.ArrowException) as e:
+            logger.warning("Cópia em disco da aba %s ignorada: %s", nome_aba, e)
+            return None
+
+        if estado.pop("versao", None) != VERSAO_ESPELHO:
+            return None
+
+        return tabela.to_pandas(), estado
+
+
+# Leitura incremental das abas do JotForm, que só crescem com novas submissões no fim.
+# Para cada aba guarda o cabeçalho, quantas linhas já foram lidas, a última linha (com o Submission ID)
+# e o DataFrame já tratado. Nas recargas seguintes lê só o cabeçalho e as linhas a partir da última já
+# conhecida, trata só as novas e as junta ao DataFrame anterior.
+# Se o cabeçalho ou a última linha conhecida tiverem mudado (edição, exclusão, reordenação), a aba é
+# relida por inteiro. Edições em linhas mais antigas aparecem na releitura completa periódica,
+# feita a cada reconciliar_a_cada segundos (0 desliga a leitura incremental).
+# Com consultar_modificacao (função que devolve a data de modificação da planilha, ou None se não souber),
+# a aba nem é lida enquanto a planilha não tiver sido modificada desde a última leitura dela.
+class SincronizadorAbas:
+    def __init__(self, ler_intervalos, tratamentos, reconciliar_a_cada, espelho=None, consultar_modificacao=None):
+        self._ler_intervalos = ler_intervalos
+        self._tratamentos = tratamentos
+        self.reconciliar_a_cada = reconciliar_a_cada
+        self._espelho = espelho
+        self._consultar_modificacao = consultar_modificacao
+        # nome da aba -> {"cabecalho", "linhas", "ultima_linha", "dados", "reconciliado_em", "modificada_em"}
+        self._estados = {}
+        # Abas que devem ser relidas por inteiro na próxima leitura (ver esquecer)
+        self._a_esquecer = set()
+        self._lock_esquecer = threading.Lock()
+
+    # Retoma o estado das abas a partir da cópia em disco. Devolve {nome da aba: DataFrame} das abas restauradas.
+    def restaurar(self):
+        if self._espelho is None:
+            return {}
+
+        restauradas = {}
+        for nome_aba in self._tratamentos:
+            copia = self._espelho.carregar(nome_aba)
+            if copia is None:
+                continue
+            dados, estado = copia
+
+            # O momento da última releitura completa é guardado em horário de relógio
+            reconciliado_ha = max(0.0, time.time() - estado.pop("reconciliado_em_relogio"))
+            self._estados[nome_aba] = {**estado, "dados": dados, "reconciliado_em": time.monotonic() - reconciliado_ha}
+            restauradas[nome_aba] = dados
+
+        return restauradas
+
+    def _salvar(self, nome_aba):
+        if self._espelho is None:
+            return
+
+        estado = self._estados[nome_aba]
+        reconciliado_em_relogio = time.time() - (time.monotonic() - estado["reconciliado_em"])
+        try:
+            self._espelho.salvar(nome_aba, estado["dados"], {
+                "cabecalho": estado["cabecalho"],
+                "linhas": estado["linhas"],
+                "ultima_linha": estado["ultima_linha"],
+                "reconciliado_em_relogio": reconciliado_em_relogio,
+                "modificada_em": estado.get("modificada_em"),
+            })
+        except (OSError, pa.ArrowException):
+            # Sem a cópia em disco o app continua funcionando; só o próximo início fica mais lento
+            logger.exception("Erro ao gravar a cópia em disco da aba %s", nome_aba)
+
+    def contem_submissao(self, nome_aba, submission_id):
+        estado = self._estados.get(nome_aba)
+        return estado is not None and (estado["dados"]["Submission ID"] == submission_id).any()
+
+    # Faz a próxima leitura da aba ir à planilha, mesmo sem mudança na data de modificação.
+    # Com completa=True a aba é relida por inteiro (a leitura incremental não vê edições em linhas antigas).
+    def marcar_alterada(self, nome_aba, completa=False):
+        if completa:
+            self._estados.pop(nome_aba, None)
+        elif nome_aba in self._estados:
+            self._estados[nome_aba]["modificada_em"] = None
+
+    # Faz a próxima leitura das abas (todas, sem nomes_abas) relê-las por inteiro.
+    # Usado quando o usuário pede para atualizar a página, já que a leitura incremental não vê edições em linhas antigas.
+    # O estado não é apagado aqui, fora dos locks das abas: quem descarta é a próxima leitura (ver ler_e_tratar),
+    # para não tirar o estado de uma leitura que já está em andamento.
+    def esquecer(self, nomes_abas=None):
+        with self._lock_esquecer:
+            self._a_esquecer.update(self._tratamentos if nomes_abas is None else nomes_abas)
+
+    def _incremental(self, nome_aba, agora):
+        estado = self._estados.get(nome_aba)
+        return estado is not None and agora - estado["reconciliado_em"] < self.reconciliar_a_cada
+
+    def _intervalo_novas(self, nome_aba):
+        # Da última linha já lida (a linha 1 é o cabeçalho) até o fim da aba, nas colunas do cabeçalho
+        estado = self._estados[nome_aba]
+        ultima_coluna = rowcol_to_a1(1, len(estado["cabecalho"])).rstrip("0123456789")
+        return absolute_range_name(nome_aba, f"A{estado['linhas'] + 1}:{ultima_coluna}")
+
+    def _carregar_completa(self, nome_aba, valores, modificada_em=None):
+        valores = fill_gaps(valores)
+        dados = self._tratamentos[nome_aba](valores)
+
+        if len(valores) > 1:
+            self._estados[nome_aba] = {
+                "cabecalho": valores[0],
+                "linhas": len(valores) - 1,
+                "ultima_linha": completar_linha(valores[-1], len(valores[0])),
+                "dados": dados,
+                "reconciliado_em": time.monotonic(),
+                "modificada_em": modificada_em,
+            }
+            self._salvar(nome_aba)
+        else:
+            # Aba sem submissões: na próxima recarga ela é lida por inteiro de novo
+            self._estados.pop(nome_aba, None)
+
+        return dados
+
+    # Junta as linhas novas ao DataFrame da aba. Devolve False se a aba precisar ser relida por inteiro.
+    def _aplicar_novas(self, nome_aba, cabecalho, valores, modificada_em=None):
+        estado = self._estados[nome_aba]
+        largura = len(estado["cabecalho"])
+
+        if not cabecalho or completar_linha(cabecalho[0], largura) != estado["cabecalho"] or not valores:
+            return False
+
+        linhas = [completar_linha(linha, largura) for linha in valores]
+
+        # A primeira linha lida é a última já conhecida: se ela mudou, o que já foi lido não vale mais
+        if linhas[0] != estado["ultima_linha"]:
+            return False
+
+        estado["modificada_em"] = modificada_em
+
+        novas = linhas[1:]
+        if not novas:
+            return True
+
+        df_novas = self._tratamentos[nome_aba]([estado["cabecalho"]] + novas)
+        # Mantém o índice igual ao de uma leitura completa (posição da linha entre as submissões)
+        df_novas.index = df_novas.index + estado["linhas"]
+
+        if not df_novas.empty:
+            if estado["dados"].empty:
+                estado["dados"] = df_novas
+            else:
+                estado["dados"] = pd.concat([estado["dados"], df_novas])
+
+        estado["linhas"] += len(novas)
+        estado["ultima_linha"] = novas[-1]
+        self._salvar(nome_aba)
+        return True
+
+    # Devolve {nome da aba: DataFrame tratado}. Se a aba não mudou, devolve o mesmo DataFrame da recarga anterior.
+    def ler_e_tratar(self, nomes_abas):
+        agora = time.monotonic()
+        dados = {}
+
+        # Descarta o estado das abas esquecidas. Aqui a leitura já roda com os locks das abas
+        with self._lock_esquecer:
+            esquecidas = self._a_esquecer.intersection(nomes_abas)
+            self._a_esquecer.difference_update(esquecidas)
+        for nome_aba in esquecidas:
+            self._estados.pop(nome_aba, None)
+
+        # A data de modificação é consultada antes da leitura: o que mudar durante a leitura aparece na próxima
+        modificada_em = self._consultar_modificacao() if self._consultar_modificacao else None
+        if modificada_em is not None:
+            for nome_aba in nomes_abas:
+                estado = self._estados.get(nome_aba)
+                if estado is not None and estado.get("modificada_em") == modificada_em:
+                    dados[nome_aba] = estado["dados"]
+
+            # Nenhuma aba mudou: não lê nada da planilha
+            nomes_abas = [nome_aba for nome_aba in nomes_abas if nome_aba not in dados]
+            if not nomes_abas:
+                return dados
+
+        incrementais = [nome_aba for nome_aba in nomes_abas if self._incremental(nome_aba, agora)]
+        completas = [nome_aba for nome_aba in nomes_abas if nome_aba not in incrementais]
+
+        # Uma única requisição: as abas inteiras e, das incrementais, o cabeçalho e as linhas novas
+        intervalos = [absolute_range_name(nome_aba) for nome_aba in completas]
+        for nome_aba in incrementais:
+            intervalos += [absolute_range_name(nome_aba, "1:1"), self._intervalo_novas(nome_aba)]
+        valores = iter(self._ler_intervalos(intervalos))
+
+        for nome_aba in completas:
+            dados[nome_aba] = self._carregar_completa(nome_aba, next(valores), modificada_em)
+
+        relidas = []
+        for nome_aba in incrementais:
+            cabecalho, novas = next(valores), next(valores)
+            if self._aplicar_novas(nome_aba, cabecalho, novas, modificada_em):
+                dados[nome_aba] = self._estados[nome_aba]["dados"]
+            else:
+                relidas.append(nome_aba)
+
+        # Abas que mudaram de um jeito que a leitura incremental não cobre são relidas por inteiro
+        if relidas:
+            logger.info("Relendo por inteiro as abas alteradas: %s", relidas)
+            for nome_aba, valores_aba in zip(relidas, self._ler_intervalos([absolute_range_name(nome_aba) for nome_aba in relidas])):
+                dados[nome_aba] = self._carregar_completa(nome_aba, valores_aba, modificada_em)
+
+        return dados
+
+
+# Data de modificação da planilha, consultada no máximo uma vez a cada intervalo e compartilhada entre as sessões.
+# Quem chega durante uma consulta espera por ela e reaproveita o resultado. Se a consulta falhar
+# (por exemplo, sem o escopo do Drive), devolve None e as abas são lidas como antes.
+class MonitorModificacoes:
+    def __init__(self, consultar, intervalo):
+        self._consultar = consultar
+        self.intervalo = intervalo
+        self._valor = None
+        self._consultado_em = None
+        self._lock = threading.Lock()
+
+    def modificada_em(self):
+        with self._lock:
+            if self._consultado_em is not None and time.monotonic() - self._consultado_em < self.intervalo:
+                return self._valor
+
+            try:
+                self._valor = self._consultar()
+            except Exception as e:
+                logger.warning("Não foi possível consultar a data de modificação da planilha: %s", e)
+                self._valor = None
+            self._consultado_em = time.monotonic()
+            return self._valor
+
+    # Descarta a data guardada: a próxima chamada consulta a planilha, mesmo dentro do intervalo
+    def esquecer(self):
+        with self._lock:
+            self._consultado_em = None
+
+
+# Um único monitor da data de modificação por processo (None se a verificação estiver desligada)
+@st.cache_resource(show_spinner=False)
+def obter_monitor_modificacoes():
+    if not VERIFICAR_MODIFICACAO_A_CADA:
+        return None
+    return MonitorModificacoes(consultar_modificacao_planilha, VERIFICAR_MODIFICACAO_A_CADA)
+
+
+# Um único sincronizador por processo. Quem garante que uma aba não é sincronizada por duas sessões
+# ao mesmo tempo é o lock por aba do cache de planilhas.
+# Ao ser criado, retoma as abas da cópia em disco e as deixa no cache como snapshots vencidos: as primeiras
+# páginas são servidas do disco e as abas são atualizadas (só as linhas novas) em segundo plano.
+@st.cache_resource(show_spinner=False)
+def obter_sincronizador_abas():
+    espelho = EspelhoParquet(DIRETORIO_ESPELHO) if DIRETORIO_ESPELHO else None
+    monitor = obter_monitor_modificacoes()
+    sincronizador = SincronizadorAbas(
+        ler_intervalos, TRATAMENTOS_ABAS, RECONCILIAR_PLANILHAS_A_CADA, espelho,
+        consultar_modificacao=monitor.modificada_em if monitor else None,
+    )
+
+    cache = obter_cache_planilhas()
+    for nome_aba, dados in sincronizador.restaurar().items():
+        cache.semear(nome_aba, dados)
+
+    return sincronizador
+
+
+# Carrega os snapshots das abas ({nome da aba: snapshot}), passando pelo cache compartilhado entre as sessões
+def carregar_snapshots(nomes_abas):
+    # Cria o sincronizador antes de consultar o cache, para que as cópias em disco já estejam nele
+    return obter_cache_planilhas().obter_snapshots(nomes_abas, obter_sincronizador_abas().ler_e_tratar)
+
+
+# Snapshots (SAVs, RVSs) com as viagens do próprio usuário, de acordo com o tipo de usuário
+def carregar_snapshots_usuario(tipo_usuario):
+    nome_savs, nome_rvss = ABAS_POR_TIPO_USUARIO[tipo_usuario]
+    snapshots = carregar_snapshots([nome_savs, nome_rvss])
+    return snapshots[nome_savs], snapshots[nome_rvss]
+
+
+# Calcula uma estrutura derivada do snapshot (índice, mapa etc.) só uma vez por versão do snapshot
+def derivado_do_snapshot(snapshot, chave, calcular):
+    derivados = snapshot["derivados"]
+    acerto = chave in derivados
+    if not acerto:
+        derivados[chave] = calcular(snapshot["dados"])
+    obter_metricas().contar_consulta("derivados", acerto)
+    return derivados[chave]
+
+
+# Índice {cpf só com números: posições das linhas} de uma coluna de CPF
+def indexar_por_cpf(df, coluna_cpf):
+    cpfs = df[coluna_cpf].astype(str).str.replace(r"\D", "", regex=True)
+    return df.groupby(cpfs.values, sort=False).indices
+
+
+# Devolve só as linhas do snapshot que pertencem ao CPF, usando o índice por CPF do snapshot
+def linhas_do_cpf(snapshot, coluna_cpf, cpf):
+    indice = derivado_do_snapshot(snapshot, ("por_cpf", coluna_cpf), lambda df: indexar_por_cpf(df, coluna_cpf))
+    posicoes = indice.get(normalizar_cpf(cpf), [])
+
+    # Cópia só das linhas do usuário, para que as alterações feitas na página não mexam no snapshot
+    return snapshot["dados"].iloc[posicoes].copy()
+
+
+# Mapa {código da viagem em maiúsculas: posição do relatório} de um DataFrame de RVSs
+def mapear_relatorios(df_rvss):
+    codigos = df_rvss["Código da viagem:"].str.upper()
+
+    # Se houver mais de um relatório para a mesma viagem, vale o primeiro
+    primeiros = ~codigos.duplicated()
+
+    return dict(zip(codigos[primeiros], np.flatnonzero(primeiros.values)))
+
+
+# Devolve o relatório (linha do snapshot de RVSs) da viagem, ou None se ainda não foi entregue
+def buscar_relatorio(snapshot_rvss, codigo_viagem):
+    mapa = derivado_do_snapshot(snapshot_rvss, "por_codigo", mapear_relatorios)
+    posicao = mapa.get(codigo_viagem.upper())
+
+    return None if posicao is None else snapshot_rvss["dados"].iloc[posicao]
+
+
+# CPFs (só números) com alguma viagem já terminada e sem relatório entregue, numa passada vetorizada
+# sobre o DataFrame de SAVs inteiro (todos os usuários de uma vez)
+def cpfs_impedidos(df_savs, coluna_cpf, codigos_com_relatorio, hoje):
+    sem_relatorio = ~df_savs["Código da viagem:"].str.upper().isin(codigos_com_relatorio)
+    terminadas = df_savs["Data final:"] < pd.Timestamp(hoje)
+
+    cpfs = df_savs.loc[sem_relatorio & terminadas, coluna_cpf].astype(str).str.replace(r"\D", "", regex=True)
+    return frozenset(cpfs)
+
+
+# Diz se o usuário está impedido de pedir uma nova viagem (tem relatório pendente de viagem já terminada).
+# O conjunto de CPFs impedidos fica guardado no snapshot de SAVs e só é recalculado quando mudam
+# o snapshot de SAVs, o de RVSs ou o dia.
+def usuario_impedido(snapshot_savs, coluna_cpf, snapshot_rvss, cpf):
+    hoje = date.today()
+    chave = (snapshot_rvss["versao"], hoje)
+
+    derivados = snapshot_savs["derivados"]
+    guardado = derivados.get(("impedidos", coluna_cpf))
+    if guardado is None or guardado[0] != chave:
+        codigos_com_relatorio = derivado_do_snapshot(snapshot_rvss, "por_codigo", mapear_relatorios).keys()
+        guardado = (chave, cpfs_impedidos(snapshot_savs["dados"], coluna_cpf, codigos_com_relatorio, hoje))
+        derivados[("impedidos", coluna_cpf)] = guardado
+
+    return normalizar_cpf(cpf) in guardado[1]
+
+
+
+# ##################################################################
+# WEBHOOKS DO JOTFORM
+# ##################################################################
+
+# Receptor dos webhooks de submissão e edição dos formulários do JotForm. Cada webhook atualiza, em segundo plano,
+# só a aba do formulário, sem esperar o vencimento do cache: a viagem nova aparece logo para o usuário.
+#
+# Configuração na seção [webhook] do st.secrets (opcional). Sem porta ou sem chave, o receptor não é iniciado.
+# No JotForm, o webhook de cada formulário aponta para http://<servidor>:<porta>/jotform?chave=<chave>.
+# Por padrão o receptor só escuta em 127.0.0.1 (atrás de um proxy reverso com HTTPS); endereco = "0.0.0.0" o expõe
+# em todas as interfaces.
+# Para testar localmente:
+#   curl -X POST "http://localhost:8502/jotform?chave=<chave>" -d formID=<id do formulário> -d submissionID=123
+config_webhook = st.secrets.get("webhook", {})
+PORTA_WEBHOOK = int(config_webhook.get("porta", 0))
+ENDERECO_WEBHOOK = config_webhook.get("endereco", "127.0.0.1")
+CHAVE_WEBHOOK = config_webhook.get("chave", "")
+# Tamanho máximo do corpo do POST, em bytes (o JotForm manda só os campos; os anexos vão como links)
+TAMANHO_MAXIMO_WEBHOOK = int(config_webhook.get("tamanho_maximo", 1024 * 1024))
+
+# O JotForm chama o webhook logo após a submissão, às vezes antes de a linha chegar à planilha.
+# Uma submissão nova é procurada de novo depois de cada espera (segundos, contados da tentativa anterior),
+# até aparecer na aba.
+ESPERAS_WEBHOOK = [0, 2, 5, 10, 20]
+
+# Aba de cada formulário, pela chave do link do formulário em st.secrets['links']
+ABAS_POR_LINK = {
+    "url_sav_int": "SAVs INTERNAS Portal",
+    "url_rvs_int": "RVSs INTERNOS Portal",
+    "url_sav_ext": "SAVs EXTERNAS Portal",
+    "url_rvs_ext": "RVSs EXTERNOS Portal",
+    "url_sav_trc": "SAVs TERCEIROS Portal",
+    "url_rvs_trc": "RVSs TERCEIROS Portal",
+}
+
+# Abas (SAVs, RVSs) de cada prefixo do código da viagem, o mesmo filtro usado no tratamento das abas
+ABAS_POR_PREFIXO = {
+    "SAV-": ["SAVs INTERNAS Portal", "RVSs INTERNOS Portal"],
+    "EXT-": ["SAVs EXTERNAS Portal", "RVSs EXTERNOS Portal"],
+    "TRC-": ["SAVs TERCEIROS Portal", "RVSs TERCEIROS Portal"],
+}
+
+PADRAO_CODIGO_VIAGEM = re.compile(r"\b(SAV|EXT|TRC)-[0-9A-Z]+", re.IGNORECASE)
+
+
+# Mapa {ID do formulário no JotForm: aba}, tirado dos links dos formulários (https://form.jotform.com/<ID>)
+def mapear_formularios(links):
+    formularios = {}
+    for chave_link, nome_aba in ABAS_POR_LINK.items():
+        encontrado = re.search(r"/(\d{6,})(?:[/?#]|$)", str(links.get(chave_link, "")))
+        if encontrado:
+            formularios[encontrado.group(1)] = nome_aba
+    return formularios
+
+
+# Abas afetadas por um webhook do JotForm e o ID da submissão (None se não der para saber em qual aba ela está).
+# campos são os campos do POST: formID, submissionID, pretty ("Pergunta:Resposta, ...") e rawRequest (JSON).
+def interpretar_webhook(campos, formularios):
+    formulario = str(campos.get("formID", "")).strip()
+    submission_id = str(campos.get("submissionID", "")).strip() or None
+
+    # Formulário conhecido: só a aba dele
+    if formulario in formularios:
+        return [formularios[formulario]], submission_id
+
+    # Formulário desconhecido: as abas de SAVs e de RVSs do prefixo do código da viagem, se houver um código
+    encontrado = PADRAO_CODIGO_VIAGEM.search(f"{campos.get('pretty', '')} {campos.get('rawRequest', '')}")
+    if encontrado:
+        return ABAS_POR_PREFIXO[encontrado.group(1).upper() + "-"], None
+
+    return [], None
+
+
+# Aplica, numa thread em segundo plano, as atualizações de abas pedidas pelos webhooks do JotForm.
+# Submissão nova: leitura incremental da aba, repetida depois de cada espera até a submissão aparecer.
+# Edição (a submissão já está na aba): releitura completa da aba, agora e depois da última espera.
+# As sessões continuam recebendo o snapshot anterior até a troca. As esperas não prendem a thread:
+# a nova tentativa é reagendada, e os outros webhooks seguem sendo atendidos.
+class AtualizadorWebhooks:
+    def __init__(self, cache, sincronizador, esperas):
+        self._cache = cache
+        self._sincronizador = sincronizador
+        self.esperas = esperas
+        self._fila = queue.Queue()
+        threading.Thread(target=self._trabalhar, name="webhooks-jotform", daemon=True).start()
+
+    def enfileirar(self, nomes_abas, submission_id=None):
+        self._fila.put({"abas": nomes_abas, "submission_id": submission_id, "tentativa": 0, "edicao": None})
+
+    def _trabalhar(self):
+        while True:
+            pedido = self._fila.get()
+            try:
+                self._processar(pedido)
+            except Exception:
+                # Se a atualização falhar, as abas são atualizadas no vencimento normal do cache
+                logger.exception("Erro ao atualizar as abas %s pelo webhook", pedido["abas"])
+            finally:
+                self._fila.task_done()
+
+    def _processar(self, pedido):
+        nomes_abas, submission_id = pedido["abas"], pedido["submission_id"]
+
+        # Na primeira tentativa, vê se é uma edição (a submissão já está na aba)
+        if pedido["edicao"] is None:
+            pedido["edicao"] = submission_id is not None and any(
+                self._sincronizador.contem_submissao(nome_aba, submission_id) for nome_aba in nomes_abas
+            )
+        edicao = pedido["edicao"]
+
+        snapshots = self._recarregar(nomes_abas, completa=edicao)
+        encontrada = submission_id is not None and any(
+            (snapshot["dados"]["Submission ID"] == submission_id).any() for snapshot in snapshots.values()
+        )
+
+        # Sem ID da submissão não há o que conferir: uma leitura basta
+        if submission_id is None:
+            esperas = self.esperas[:1]
+        elif edicao:
+            esperas = [self.esperas[0], self.esperas[-1]]
+        else:
+            esperas = self.esperas
+
+        if (encontrada and not edicao) or pedido["tentativa"] + 1 >= len(esperas):
+            if submission_id is not None and not edicao and not encontrada:
+                logger.warning("A submissão %s do webhook não apareceu nas abas %s", submission_id, nomes_abas)
+            return
+
+        # Reagenda a próxima tentativa, sem ocupar a thread durante a espera
+        pedido["tentativa"] += 1
+        temporizador = threading.Timer(esperas[pedido["tentativa"]], self._fila.put, args=(pedido,))
+        temporizador.daemon = True
+        temporizador.start()
+
+    def _recarregar(self, nomes_abas, completa):
+        def carregar_varias(pendentes):
+            # Marca as abas dentro da recarga, com os locks delas, para nenhuma outra recarga ler o estado pela metade
+            for nome_aba in pendentes:
+                self._sincronizador.marcar_alterada(nome_aba, completa)
+            return self._sincronizador.ler_e_tratar(pendentes)
+
+        return self._cache.recarregar(nomes_abas, carregar_varias)
+
+
+# Recebe os POSTs dos webhooks em /jotform. Responde logo (202) e deixa a atualização para o AtualizadorWebhooks.
+# Aceita multipart/form-data (o que o JotForm envia), application/x-www-form-urlencoded e JSON.
+# O servidor guarda a chave, o mapa de formulários e o atualizador (ver iniciar_receptor_webhooks).
+class ReceptorJotForm(BaseHTTPRequestHandler):
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/jotform":
+            return self._responder(404, {"erro": "caminho desconhecido"})
+
+        chave = parse_qs(url.query).get("chave", [""])[0]
+        if not hmac.compare_digest(chave.encode(), self.server.chave.encode()):
+            return self._responder(403, {"erro": "chave inválida"})
+
+        try:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            return self._responder(400, {"erro": "Content-Length inválido"})
+        if tamanho > TAMANHO_MAXIMO_WEBHOOK:
+            # O corpo não é lido: fecha a conexão depois da resposta
+            self.close_connection = True
+            return self._responder(413, {"erro": "corpo grande demais"})
+
+        try:
+            campos = ler_campos_post(self.headers.get("Content-Type", ""), self.rfile.read(tamanho))
+        except ValueError as e:
+            return self._responder(400, {"erro": f"corpo inválido: {e}"})
+
+        nomes_abas, submission_id = interpretar_webhook(campos, self.server.formularios)
+        if not nomes_abas:
+            return self._responder(422, {"erro": "formulário desconhecido e sem código de viagem"})
+
+        self.server.atualizador.enfileirar(nomes_abas, submission_id)
+        self._responder(202, {"abas": nomes_abas, "submissionID": submission_id})
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    # A query string leva a chave do webhook: no log vão só o método, o caminho e o status
+    def log_request(self, code="-", size="-"):
+        self.log_message('"%s %s" %s', self.command, urlsplit(self.path).path, code)
+
+    def log_message(self, formato, *args):
+        logger.info("Webhook %s: " + formato, self.address_string(), *args)
+
+
+# Lê os campos do corpo de um POST ({nome: valor}), conforme o Content-Type
+def ler_campos_post(tipo_conteudo, corpo):
+    if tipo_conteudo.startswith("multipart/form-data"):
+        mensagem = BytesParser(policy=email_policy.HTTP).parsebytes(
+            f"Content-Type: {tipo_conteudo}\r\n\r\n".encode("latin-1") + corpo
+        )
+        if not mensagem.is_multipart():
+            raise ValueError("multipart sem partes")
+        return {
+            parte.get_param("name", header="content-disposition"): parte.get_content()
+            for parte in mensagem.iter_parts()
+            if parte.get_param("name", header="content-disposition")
+        }
+
+    if tipo_conteudo.startswith("application/json"):
+        try:
+            campos = json.loads(corpo or b"{}")
+        except json.JSONDecodeError as e:
+            raise ValueError(str(e))
+        if not isinstance(campos, dict):
+            raise ValueError("o JSON deve ser um objeto")
+        return campos
+
+    return {nome: valores[-1] for nome, valores in parse_qs(corpo.decode("utf-8")).items()}
+
+
+# Um único receptor de webhooks por processo. Se a porta estiver ocupada, o portal segue sem ele.
+@st.cache_resource(show_spinner=False)
+def iniciar_receptor_webhooks():
+    if not (PORTA_WEBHOOK and CHAVE_WEBHOOK):
+        return None
+
+    try:
+        servidor = ThreadingHTTPServer((ENDERECO_WEBHOOK, PORTA_WEBHOOK), ReceptorJotForm)
+    except OSError as e:
+        logger.warning("Não foi possível iniciar o receptor de webhooks na porta %s: %s", PORTA_WEBHOOK, e)
+        return None
+
+    servidor.daemon_threads = True
+    servidor.chave = CHAVE_WEBHOOK
+    servidor.formularios = mapear_formularios(st.secrets["links"])
+    servidor.atualizador = AtualizadorWebhooks(obter_cache_planilhas(), obter_sincronizador_abas(), ESPERAS_WEBHOOK)
+    threading.Thread(target=servidor.serve_forever, name="receptor-webhooks", daemon=True).start()
+    return servidor
+
+
+
 @st.dialog("Cadastrar viajante externo", width="large")
 def cadastrar_externo():
     with st.form("cadastrar_externo"):
@@ -652,6 +2215,8 @@ def cadastrar_externo():
                 atualizacoes = {
                     "nome_completo": nome_input,
                     "cpf": cpf_input,
+                    "cpf_normalizado": normalizar_cpf(cpf_input),
+                    "palavras_busca": palavras_busca(nome_input),
                     "email": email_input,
                     "data_nascimento": data_nascimento_input,
                     "genero": genero_input,
@@ -665,7 +2230,12 @@ def cadastrar_externo():
                     }
                 }
                 # Insere o novo usuário no banco de dados
-                banco_de_dados["usuarios_externos"].insert_one(atualizacoes)
+                try:
+                    banco_de_dados["usuarios_externos"].insert_one(atualizacoes)
+                except DuplicateKeyError:
+                    # O índice único do CPF impede cadastros duplicados
+                    st.error("Já existe um viajante cadastrado com este CPF.")
+                    return
                 # Exibe uma mensagem de sucesso
                 st.success(":material/check: Viajante cadastrado com sucesso!")
                 # Aguarda 3 segundos antes de atualizar a página
@@ -695,33 +2265,21 @@ def check_cpf(cpf_input):
         # Atualiza CPF no session state
         st.session_state.cpf_inserido = cpf_numeros  
 
-        # Busca primeiro nos usuários internos
-        df_usuarios_internos = carregar_internos()
-
-        # Verifica se existe um usuário interno com o CPF informado
-        usuario_interno = df_usuarios_internos[df_usuarios_internos["cpf"] == cpf_numeros]
-        
-        # Se encontrou pelo menos um resultado, o CPF é de um usuário interno
-        if not usuario_interno.empty:  
-            # Recupera o dicionário do usuário interno
-            usuario = usuario_interno.iloc[0].to_dict()
-            # Atualiza o tipo de usuário e o usuário no session state
-            st.session_state.tipo_usuario = "interno"
-            st.session_state.usuario = usuario  
-            # Retorna True, sem precisar carregar os usuários externos
-            return True
+        # Garante que o campo cpf_normalizado existe e está indexado
+        garantir_indices_cpf()
 
-        # Se não for interno, busca nos usuários externos
-        df_usuarios_externos = carregar_externos()
-      
-        # Verifica se o CPF existe nos usuários externos
-        usuario_externo = df_usuarios_externos[df_usuarios_externos["cpf"] == cpf_numeros]
+        # Busca primeiro nos usuários internos, depois nos externos. Cada busca usa o índice do CPF normalizado.
+        for tipo_usuario, nome_colecao in [("interno", "usuarios_internos"), ("externo", "usuarios_externos")]:
+            usuario = banco_de_dados[nome_colecao].find_one({"cpf_normalizado": cpf_numeros})
 
-        if not usuario_externo.empty:  # Se encontrou pelo menos um resultado
-            usuario = usuario_externo.iloc[0].to_dict()
-            st.session_state.tipo_usuario = "externo"
-            st.session_state.usuario = usuario  
-            return True  # Retorna imediatamente
+            # Se encontrou, atualiza o tipo de usuário e o usuário no session state
+            if usuario is not None:
+                # O resto do portal trabalha com o CPF só com números
+                usuario["cpf"] = cpf_numeros
+                st.session_state.tipo_usuario = tipo_usuario
+                st.session_state.usuario = usuario
+                # Retorna True, sem precisar buscar na outra coleção
+                return True
 
         # Se não encontrou nem interno nem externo, marca como "novo"
         st.session_state.tipo_usuario = "novo"
@@ -833,26 +2391,65 @@ def pagina_login_etapa_1():
 
 
 # Página de login etapa 2 - Código por e-mail
-def pagina_login_etapa_2():
-    if "codigo_enviado" not in st.session_state:
-        st.session_state.codigo_enviado = False
-    if "codigo_verificacao" not in st.session_state:
-        st.session_state.codigo_verificacao = None
-    
-    # Exibe o cabeçalho com o título
-    cabecalho_login()
+# Acompanha o envio do código enquanto ele está na fila, sem travar a página
+# Quando o envio termina (com sucesso ou não), recarrega a página inteira e para de consultar
+@st.fragment(run_every=1)
+def acompanhar_envio_codigo():
+    if st.session_state.envio_codigo["status"] in ("enviado", "falhou"):
+        st.rerun()
 
-    # Informa que o código foi enviado para o e-mail
     st.markdown(
         """
         <div style="text-align: center;">
-            <strong style="font-size: 1.2em; color: #007ad3;">Foi enviado um código de 3 dígitos para o seu e-mail.</strong>
+            <strong style="font-size: 1.2em; color: #007ad3;">Enviando um código de 3 dígitos para o seu e-mail...</strong>
             
         </div>
         """,
         unsafe_allow_html=True
     )
 
+
+def pagina_login_etapa_2():
+    if "codigo_enviado" not in st.session_state:
+        st.session_state.codigo_enviado = False
+    if "codigo_verificacao" not in st.session_state:
+        st.session_state.codigo_verificacao = None
+    if "envio_codigo" not in st.session_state:
+        st.session_state.envio_codigo = None
+    
+    # Exibe o cabeçalho com o título
+    cabecalho_login()
+
+    # Se ainda não há código gerado, cria um novo
+    if not st.session_state.codigo_enviado:
+        st.session_state.codigo_verificacao = str(random.randint(100, 999))  # Garante que seja string
+        
+        # Coloca o e-mail na fila de envio (o envio acontece em segundo plano)
+        st.session_state.envio_codigo = enviar_email(st.session_state.usuario["email"], st.session_state.codigo_verificacao)
+        st.session_state.codigo_enviado = True
+
+    envio = st.session_state.envio_codigo
+
+    if envio["status"] == "enviado":
+        # Informa que o código foi enviado para o e-mail
+        st.markdown(
+            """
+            <div style="text-align: center;">
+                <strong style="font-size: 1.2em; color: #007ad3;">Foi enviado um código de 3 dígitos para o seu e-mail.</strong>
+                
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+    elif envio["status"] == "falhou":
+        st.error(f"Erro ao enviar e-mail: {envio['erro']}")
+        # Permite gerar um novo código e tentar o envio de novo
+        if st.button("Reenviar código", icon=":material/refresh:"):
+            st.session_state.codigo_enviado = False
+            st.rerun()
+    else:
+        acompanhar_envio_codigo()
+
     st.write('')
 
     # Exibe o e-mail do usuário
@@ -872,14 +2469,6 @@ def pagina_login_etapa_2():
     # Divide a tela em 3 colunas
     col1, col2, col3 = st.columns([5, 2, 5])    
 
-    # Se ainda não há código gerado, cria um novo
-    if not st.session_state.codigo_enviado:
-        st.session_state.codigo_verificacao = str(random.randint(100, 999))  # Garante que seja string
-        
-        # Envia o e-mail
-        if enviar_email(st.session_state.usuario["email"], st.session_state.codigo_verificacao):
-            st.session_state.codigo_enviado = True
-
     # Solicita o Código
     with col2.form("codigo_login", border=False):
         codigo_input = st.text_input("Informe o código recebido", placeholder="000")
@@ -948,6 +2537,8 @@ def novo_cadastro():
                     "nome_completo": nome_completo,
                     "data_nascimento": data_nascimento.strftime("%d/%m/%Y"),  # Formata a data no formato "DD/MM/YYYY"
                     "cpf": cpf,
+                    "cpf_normalizado": normalizar_cpf(cpf),
+                    "palavras_busca": palavras_busca(nome_completo),
                     "genero": genero,
                     "rg": rg,
                     "telefone": telefone,
@@ -960,7 +2551,12 @@ def novo_cadastro():
                     }
                 }
                 # Insere o novo usuário na coleção do banco de dados
-                colecao.insert_one(novo_usuario)
+                try:
+                    colecao.insert_one(novo_usuario)
+                except DuplicateKeyError:
+                    # O índice único do CPF impede cadastros duplicados
+                    st.error("Já existe um cadastro com este CPF.")
+                    return
 
                 # Atualiza o estado da sessão com o novo usuário
                 st.session_state.usuario = novo_usuario
@@ -972,35 +2568,178 @@ def novo_cadastro():
 
 
 # ##################################################################
-# PÁGINA DO USUÁRIO INTERNO
+# LISTAS DE VIAGENS
 # ##################################################################
 
 
-def home_page():
+# Monta a URL do formulário de relatório (RVS), com alguns campos pré-preenchidos a partir da SAV.
+# chave_url é a chave do link em st.secrets['links']: url_rvs_int, url_rvs_ext ou url_rvs_trc.
+def montar_url_rvs(row, chave_url):
 
-# !!!!!!!!!!!!!!
-    # Carregar dados com base no tipo de usuário
-    if st.session_state.tipo_usuario == "interno":
-        # Usuário interno: 
-        # carrega SAVs e RVSs internas
-        df_savs = carregar_savs_int()
-        df_rvss = carregar_rvss_int()
+    # Formata a data do período da viagem para o formato DD/MM/YYYY a DD/MM/YYYY
+    periodo_viagem = f"{formatar_data(row['Data inicial:'])} a {formatar_data(row['Data final:'])}"
+
+    params = {
+        "codigoDa": row["Código da viagem:"],
+        "qualE": row["Qual é a fonte do recurso?"],
+    }
 
-        # carrega SAVs e RVSs de terceiros
-        df_savs_terceiros = carregar_savs_trc()
-        df_rvss_terceiros = carregar_rvss_trc()
+    # O relatório de terceiros identifica o responsável e o viajante
+    if chave_url == "url_rvs_trc":
+        params["responsavel"] = row["Responsável pela SAV:"]
+        params["nome_viajante"] = row["Nome do(a) viajante:"]
+    else:
+        params["nomeDo"] = row["Nome completo:"]
 
+    params["email"] = row["E-mail:"]
+    params["cidadesDe"] = row["Cidades de chegada:"]  # Cidades de chegada separadas por vírgula
+    params["periodoDa"] = periodo_viagem
 
-    elif st.session_state.tipo_usuario == "externo":
-        # Usuário externo: carrega SAVs e RVSs externas
-        df_savs = carregar_savs_ext()
-        df_rvss = carregar_rvss_ext()
+    return f"{st.secrets['links'][chave_url]}?{encode_params(params)}"
 
 
-        
+# Lista de viagens com uma linha de colunas e botões por viagem. Usada nas listas pequenas.
+def mostrar_linhas_viagens(df_viagens, relatorios, colunas, titulos, larguras, chave_url_rvs, chave_lista):
+
+    # Criar cabeçalho da "tabela"
+    for col, titulo in zip(st.columns(larguras), titulos):
+        col.write(titulo)
+
+    # Datas formatadas só para as viagens mostradas
+    df_exibicao = formatar_datas(df_viagens[colunas])
+
+    # Iterar sobre a lista de viagens
+    for (index, row), valores, relatorio in zip(df_viagens.iterrows(), df_exibicao.itertuples(index=False), relatorios):
+
+        # Conteúdo da lista de viagens
+        cols = st.columns(larguras)
+
+        for col, valor in zip(cols, valores):
+            col.write(escapar_markdown(valor))
+
+        cols[-2].button('Detalhes', key=f"detalhes_{chave_lista}_{index}", on_click=mostrar_detalhes_sav, args=(row,), use_container_width=True, icon=":material/info:")
+
+        # Botão dinâmico sobre o relatório --------------------------------------------
+
+        # Se o relatório foi entregue, vê o relatório
+        if relatorio is not None:
+            cols[-1].button('Relatório entregue', key=f"entregue_{chave_lista}_{index}", on_click=mostrar_detalhes_rvs, args=(row, relatorio), use_container_width=True, icon=":material/check:", type="primary")
+
+        # Se não foi entregue, botão para enviar
+        else:
+            cols[-1].link_button('Enviar relatório', use_container_width=True, icon=":material/description:", url=montar_url_rvs(row, chave_url_rvs))
+
+        st.divider()  # Separador entre cada linha da tabela
+
+
+# Lista de viagens numa tabela única (st.dataframe) com seleção de linha. Usada nas listas grandes,
+# para não criar centenas de widgets a cada rerun. A viagem selecionada ganha os botões de detalhes e relatório.
+def mostrar_grade_viagens(df_viagens, relatorios, colunas, titulos, chave_url_rvs, chave_lista):
+
+    # Tabela só com as colunas de texto e a situação do relatório
+    titulos = [titulo.strip("*") for titulo in titulos]
+    df_grade = formatar_datas(df_viagens[colunas])
+    df_grade.columns = titulos[:len(colunas)]
+    df_grade[titulos[-1]] = ["Entregue" if relatorio is not None else "Pendente" for relatorio in relatorios]
+
+    # A seleção do st.dataframe é guardada pela posição da linha. A chave muda junto com as viagens da tabela
+    # (submissão nova, outro tamanho de página etc.): a seleção antiga é descartada em vez de apontar,
+    # na mesma posição, para outra viagem
+    versao_lista = hash(tuple(df_viagens['Código da viagem:']))
+
+    evento = st.dataframe(
+        df_grade,
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"grade_{chave_lista}_{versao_lista}",
+    )
+
+    linhas_selecionadas = evento["selection"]["rows"]
+
+    if not linhas_selecionadas:
+        st.caption("Selecione uma viagem na tabela para ver os detalhes e o relatório.")
+        return
+
+    posicao = linhas_selecionadas[0]
+    row = df_viagens.iloc[posicao]
+    relatorio = relatorios[posicao]
+
+    col1, col2, col3, col4 = st.columns([3, 3, 3, 7])
+
+    col1.write(f"**{escapar_markdown(row['Código da viagem:'])}**")
+    col2.button('Detalhes', key=f"detalhes_{chave_lista}_selecionada", on_click=mostrar_detalhes_sav, args=(row,), use_container_width=True, icon=":material/info:")
+
+    if relatorio is not None:
+        col3.button('Relatório entregue', key=f"entregue_{chave_lista}_selecionada", on_click=mostrar_detalhes_rvs, args=(row, relatorio), use_container_width=True, icon=":material/check:", type="primary")
+    else:
+        col3.link_button('Enviar relatório', use_container_width=True, icon=":material/description:", url=montar_url_rvs(row, chave_url_rvs))
+
+
+# Carrega mais uma página de viagens anteriores na lista
+def mostrar_mais_paginas(chave_paginas):
+    st.session_state[chave_paginas] += 1
+
+
+# Mostra uma lista de viagens (da mais recente para a mais antiga), paginada, com o relatório de cada uma.
+# Aparecem as viagens das páginas já carregadas e, além delas, até uma página de viagens já terminadas com relatório
+# pendente (as que impedem uma nova solicitação). As demais só são montadas quando o usuário pede, e os relatórios
+# só são buscados no snapshot de RVSs para as viagens visíveis, então o tempo de cada rerun não cresce com o histórico.
+# A parte visível é mostrada linha a linha se for pequena, ou numa tabela única se passar de LIMITE_LISTA_DETALHADA.
+# colunas são as colunas de texto do DataFrame; titulos inclui também os títulos das colunas de solicitação e relatório.
+def mostrar_lista_viagens(df_viagens, snapshot_rvss, colunas, titulos, larguras, chave_url_rvs, chave_lista):
+
+    # Quantas páginas já foram carregadas nesta lista
+    chave_paginas = f"paginas_{chave_lista}"
+    if chave_paginas not in st.session_state:
+        st.session_state[chave_paginas] = 1
+
+    col_info, col_tamanho = st.columns([12, 3])
+
+    tamanho_pagina = col_tamanho.selectbox("Viagens por página", TAMANHOS_PAGINA, key=f"tamanho_pagina_{chave_lista}")
+    limite = tamanho_pagina * st.session_state[chave_paginas]
+
+    # Viagens já terminadas e sem relatório, só pelo mapa de códigos do snapshot de RVSs (sem montar as linhas)
+    mapa_relatorios = derivado_do_snapshot(snapshot_rvss, "por_codigo", mapear_relatorios)
+    sem_relatorio = np.array([codigo.upper() not in mapa_relatorios for codigo in df_viagens['Código da viagem:']], dtype=bool)
+    pendentes = sem_relatorio & (df_viagens["Data final:"] < pd.Timestamp(date.today())).to_numpy()
+
+    # Viagens das páginas carregadas, mais no máximo uma página das pendentes mais recentes fora delas
+    # (máscara numpy: uma lista vazia seria lida pelo pandas como seleção de colunas)
+    posicoes = np.arange(len(df_viagens))
+    visiveis = posicoes < limite
+    visiveis[np.flatnonzero(pendentes & ~visiveis)[:tamanho_pagina]] = True
+    df_visiveis = df_viagens[visiveis]
+
+    # Relatório de cada viagem visível (None se ainda não foi entregue)
+    relatorios_visiveis = [buscar_relatorio(snapshot_rvss, codigo) for codigo in df_visiveis['Código da viagem:']]
+
+    col_info.caption(f"Mostrando {len(df_visiveis)} de {len(df_viagens)} viagens. As já terminadas com relatório pendente aparecem mesmo fora das páginas carregadas.")
+
+    if len(df_visiveis) > LIMITE_LISTA_DETALHADA:
+        mostrar_grade_viagens(df_visiveis, relatorios_visiveis, colunas, titulos, chave_url_rvs, chave_lista)
+    else:
+        mostrar_linhas_viagens(df_visiveis, relatorios_visiveis, colunas, titulos, larguras, chave_url_rvs, chave_lista)
+
+    # Botão para carregar a próxima página de viagens anteriores
+    if len(df_visiveis) < len(df_viagens):
+        st.button("Mostrar viagens anteriores", key=f"mais_{chave_lista}", on_click=mostrar_mais_paginas, args=(chave_paginas,), icon=":material/expand_more:")
+
+
+
+# ##################################################################
+# PÁGINA DO USUÁRIO INTERNO
+# ##################################################################
+
+
+def home_page():
+
+# !!!!!!!!!!!!!!
     # Captura o usuário do session_state para a variável usuario
     usuario = st.session_state.usuario
-    
+
+    # Os dados das planilhas são carregados dentro de cada visão, só quando ela é aberta
 
     # Cria colunas para o nome do usuário e o botão atualizar
     col1, col2, col3, col4, col5 = st.columns([2, 2, 7, 3, 3])
@@ -1023,7 +2762,7 @@ def home_page():
             
 
             # Obtém o CPF numérico do usuário
-            usuario_cpf_numerico = "".join(filter(str.isdigit, usuario['cpf']))
+            usuario_cpf_numerico = normalizar_cpf(usuario['cpf'])
 
             col1, espaco, col2 = st.columns([12, 1, 12])
 
@@ -1180,18 +2919,24 @@ def home_page():
                         usuario["banco"] = atualizacoes["banco"]
                     
                     # Atualiza o cadastro no banco de dados
+                    # Grava também o CPF normalizado, que é a chave de busca do login
+                    atualizacoes["cpf_normalizado"] = usuario_cpf_numerico
                     
 # !!!!!!!!!!!!!!!!!!!!!
 
                     if st.session_state.tipo_usuario == "interno":
                         banco_de_dados["usuarios_internos"].update_one(
-                            {"cpf": usuario_cpf_numerico},
+                            {"cpf_normalizado": usuario_cpf_numerico},
                             {"$set": atualizacoes}
                         )
 
                     elif st.session_state.tipo_usuario == "externo":
+                        # Mantém a busca por nome dos viajantes externos em dia
+                        if "nome_completo" in atualizacoes:
+                            atualizacoes["palavras_busca"] = palavras_busca(atualizacoes["nome_completo"])
+
                         banco_de_dados["usuarios_externos"].update_one(
-                            {"cpf": usuario_cpf_numerico},
+                            {"cpf_normalizado": usuario_cpf_numerico},
                             {"$set": atualizacoes}
                         )
 
@@ -1215,161 +2960,66 @@ def home_page():
         # Limpa o session_state e o cache, e recarrega a página
         st.session_state.status_usuario = ""
         st.cache_data.clear()
+        # Descarta os snapshots das planilhas e o que já foi lido delas, para reler as abas inteiras no Google Sheets
+        obter_sincronizador_abas().esquecer()
+        # e consulta de novo a data de modificação, para que a releitura não fique marcada com a data antiga
+        monitor = obter_monitor_modificacoes()
+        if monitor is not None:
+            monitor.esquecer()
+        obter_cache_planilhas().invalidar()
         st.rerun()  
         
         
     st.write("")
 
 # !!!!!!!!!!!!!!!!!!!!!!!!
-    if st.session_state.tipo_usuario == "interno":
+    # Navegação da home. Diferente do st.tabs, que executa o conteúdo de todas as abas a cada rerun,
+    # só a visão escolhida é montada, e só ela busca os seus dados.
+    visoes = VISOES_POR_TIPO_USUARIO[st.session_state.tipo_usuario]
 
-        # Abas da home
-        minhas_viagens, nova_sav, terceiros = st.tabs([":material/flight_takeoff: Minhas Viagens", ":material/add: Nova Solicitação de Viagem", ":material/group: Solicitações para Terceiros"])
+    visao = st.radio("Navegação", list(visoes), format_func=visoes.get, horizontal=True, key="visao_home", label_visibility="collapsed")
 
-    elif st.session_state.tipo_usuario == "externo":
-        minhas_viagens, nova_sav = st.tabs([":material/flight_takeoff: Minhas Viagens", ":material/add: Nova Solicitação de Viagem"])
+    st.write("")
 
     # ABA MINHAS VIAGENS
 
-    with minhas_viagens:
-
-        # Limpar a coluna CPF: quero apenas os números
-        df_savs['CPF:'] = df_savs['CPF:'].str.replace(r'[^\d]+', '', regex=True)
+    if visao == "minhas_viagens":
 
-        # Filtar SAVs com o CPF do usuário
-        df_savs = df_savs[df_savs['CPF:'].astype(str) == str(usuario['cpf'])]
-
-        # Capturar a data da viagem
-        df_savs['Data da viagem:'] = df_savs['Itinerário:'].str[6:16].replace('-', '/', regex=True)
-
-
-# !!!!!!!!!!!!!!
-        # if st.session_state.tipo_usuario == "interno":
-        destinos = r'Cidade de chegada: (.*?)(?:,|$)'
-        # elif st.session_state.tipo_usuario == "externo":
-            # destinos = r'Cidade de chegada: (.*?)(?:,|$)'
-        
-        
-        # Aplicar a regex para cada linha da coluna
-        df_savs["Destinos:"] = df_savs["Itinerário:"].apply(lambda x: ' > '.join(re.findall(destinos, x)))
-
-    
-        # Criar cabeçalho da "tabela"
-        col1, col2, col3, col4, col5 = st.columns([2, 2, 7, 3, 3])
-
-        col1.write('**Código da viagem**')
-        col2.write('**Data da viagem**')
-        col3.write('**Itinerário**')
-        col4.write('**Solicitações**')
-        col5.write('**Relatórios**')
-
-        # Iniciar a variável na session_state que vai identificar se o usuário está impedido ou não de enviar relatório (se tem algum pendente)
-        st.session_state.status_usuario = ""
-
-        # Iterar sobre a lista de viagens
-        for index, row in df_savs[::-1].iterrows():
-
-            # Preparar o link personalizado para o relatório -----------------------------------------------------
-
-            # Extrair cidade(s) de destino
-            # Transformar o itinerário em uma lista de dicionários
-            trechos = parse_itinerario(row["Itinerário:"])
-
-            # Pegando a primeira e a última data
-            data_inicial = trechos[0]["Data"]
-            data_final = trechos[-1]["Data"]
-
-            # Formata a data do período da viagem para o formato DD/MM/YYYY a DD/MM/YYYY
-            periodo_viagem = f"{data_inicial} a {data_final}".replace('-', '/')
-
-# !!!!!!!!!!!!!!!!!!!!
-            # Extraindo todas as "Cidade de chegada" e concatenando com vírgula
-            # if st.session_state.tipo_usuario == "interno":
-            cidades_chegada = [viagem["Cidade de chegada"] for viagem in trechos]
-            # elif st.session_state.tipo_usuario == "externo":
-            #     cidades_chegada = [viagem["Cidade de chegada"] for viagem in trechos]
-            
-            destinos = ", ".join(cidades_chegada)
+        with medir_fase_home("minhas_viagens_dados"):
+            # Das SAVs, a sessão só recebe as linhas do próprio usuário, pelo índice de CPF do snapshot
+            snapshot_savs, snapshot_rvss = carregar_snapshots_usuario(st.session_state.tipo_usuario)
+            df_savs = linhas_do_cpf(snapshot_savs, "CPF:", usuario['cpf'])
 
+            # Da viagem mais recente para a mais antiga. Os relatórios são buscados só para as viagens mostradas
+            df_lista = df_savs[::-1]
 
 # !!!!!!!!!!!!!!!!!!!
-            # Prepara as URLs de formulários com alguns campos pré-preenchidos
-            if st.session_state.tipo_usuario == "interno":
-                # URL do formulário de RVS interno
-                params = {
-                    "codigoDa": row["Código da viagem:"],
-                    "qualE": row["Qual é a fonte do recurso?"],
-                    "nomeDo": row["Nome completo:"],
-                    "email": row["E-mail:"],
-                    "cidadesDe": destinos,
-                    "periodoDa": periodo_viagem
-                }
-
-                jotform_rvs_url = f"{st.secrets['links']['url_rvs_int']}?{encode_params(params)}"
-
-
-            elif st.session_state.tipo_usuario == "externo":
-                # URL do formulário de RVS externo
-                params = {
-                    "codigoDa": row["Código da viagem:"],
-                    "qualE": row["Qual é a fonte do recurso?"],
-                    "nomeDo": row["Nome completo:"],
-                    "email": row["E-mail:"],
-                    "cidadesDe": destinos,
-                    "periodoDa": periodo_viagem
-                }
-
-                jotform_rvs_url = f"{st.secrets['links']['url_rvs_ext']}?{encode_params(params)}"
-
-            # ----------------------------------------------------------------------------------------------------- 
-
-            # Conteúdo da lista de viagens
-
-            col1, col2, col3, col4, col5 = st.columns([2, 2, 7, 3, 3])
-            
-            col1.write(row['Código da viagem:'])
-            col2.write(row['Data da viagem:'])
-            col3.write(row['Destinos:'])
-            col4.button('Detalhes', key=f"detalhes_{index}", on_click=mostrar_detalhes_sav, args=(row,), use_container_width=True, icon=":material/info:")
-            
-
-            # Botão dinâmico sobre o relatório --------------------------------------------
-
-            # Verificar se o relatório foi entregue. Procura se tem o código da SAV em algum relatório 
-            if row['Código da viagem:'].upper() in df_rvss['Código da viagem:'].str.upper().values:
-
-                status_relatorio = "entregue"
-
-            # Se não tem nenhum relatório com esse código de SAV
-            else:
-                status_relatorio = "pendente"
-
-                # Se a data_final da viagem menor do que hoje, o usuário está impedido
-                if pd.to_datetime(data_final, dayfirst=True).timestamp() < pd.to_datetime(date.today()).timestamp():
-                
-                    # Impede o usuário de enviar uma nova solicitação se tiver relatório pendente
-                    st.session_state.status_usuario = "impedido"
-                    
-
-            # Se o relatório foi entregue, vê o relatório  
-            if status_relatorio == "entregue":
-                col5.button('Relatório entregue', key=f"entregue_{index}", on_click=mostrar_detalhes_rvs, args=(row, df_rvss), use_container_width=True, icon=":material/check:", type="primary")
-            
-            # Se não foi entregue, botão para enviar
-            # else:
-            if status_relatorio == "pendente":
-                # Se não foi entregue, botão para enviar
-                col5.link_button('Enviar relatório', use_container_width=True, icon=":material/description:", url=jotform_rvs_url)
-
-            st.divider()  # Separador entre cada linha da tabela
+        # Formulário de relatório de acordo com o tipo de usuário
+        chave_url_rvs = "url_rvs_int" if st.session_state.tipo_usuario == "interno" else "url_rvs_ext"
+
+        with medir_fase_home("minhas_viagens_lista"):
+            mostrar_lista_viagens(
+                df_lista,
+                snapshot_rvss,
+                colunas=['Código da viagem:', 'Data inicial:', 'Destinos:'],
+                titulos=['**Código da viagem**', '**Data da viagem**', '**Itinerário**', '**Solicitações**', '**Relatórios**'],
+                larguras=[2, 2, 7, 3, 3],
+                chave_url_rvs=chave_url_rvs,
+                chave_lista="minhas",
+            )
 
 
 
     # ABA DE NOVA SOLICITAÇÃO
     
-    with nova_sav:
+    elif visao == "nova_sav":
+
+        # Verifica se o usuário está impedido de enviar uma nova solicitação (tem viagem terminada sem relatório).
+        # Vem direto dos snapshots, sem precisar montar a lista de viagens.
+        with medir_fase_home("nova_sav_status"):
+            snapshot_savs, snapshot_rvss = carregar_snapshots_usuario(st.session_state.tipo_usuario)
+            st.session_state.status_usuario = "impedido" if usuario_impedido(snapshot_savs, "CPF:", snapshot_rvss, usuario['cpf']) else ""
 
-        # Verifica se o usuário está impedido de enviar uma nova solicitação
         if st.session_state.status_usuario == "impedido":
             st.write('')
             st.write('')
@@ -1455,28 +3105,37 @@ def home_page():
 
 # !!!!!!!!!!!!!!!!!!!!!!!!
  
-    # Se for usuário interno, mostra a aba de SAVs para Terceiros
-    if st.session_state.tipo_usuario == "interno":
-       with terceiros:
+    # Aba de SAVs para Terceiros (só aparece para usuários internos)
+    elif visao == "terceiros":
 
 
         # NOVA SOLICITAÇÃO PARA TERCEIROS
 
-        df_usuarios_externos = carregar_externos()
-        df_usuarios_externos = df_usuarios_externos.sort_values(by='nome_completo', ascending=True)
-
         st.write('**Nova Solicitação para Terceiros**')
         st.write('')
 
         # Cria as colunas para o formulário
         col1, col2, col3, col4 = st.columns(4)
 
+        # Busca o(a) viajante pelo nome no banco de dados. Só os primeiros resultados vão para a lista.
+        busca_viajante = col1.text_input('Buscar viajante:', placeholder="Digite o nome do(a) viajante", key="busca_viajante")
+        with medir_fase_home("terceiros_busca"):
+            encontrados = {str(encontrado["_id"]): encontrado for encontrado in buscar_externos(busca_viajante)}
+
+        if busca_viajante and not encontrados:
+            col1.caption("Nenhum viajante encontrado.")
+
         # Selecione o(a) viajante:
-        viajante_nome = col1.selectbox('Selecione o(a) viajante:', [""] + df_usuarios_externos['nome_completo'].tolist())
+        viajante_id = col1.selectbox(
+            'Selecione o(a) viajante:',
+            [""] + list(encontrados),
+            format_func=lambda id_viajante: rotulo_externo(encontrados[id_viajante]) if id_viajante else "",
+        )
 
-        if viajante_nome != "":
+        # O cadastro completo é lido só para o viajante escolhido, pelo _id
+        viajante = carregar_externo(encontrados[viajante_id]["_id"]) if viajante_id else None
 
-            viajante = df_usuarios_externos[df_usuarios_externos['nome_completo'] == viajante_nome].iloc[0].to_dict()
+        if viajante is not None:
 
             # Monta a URL do JotForm para solicitação de SAV para Terceiros
 
@@ -1541,115 +3200,135 @@ def home_page():
         st.write('')
 
 
-        # Limpar a coluna CPF do responsável pela SAV quero apenas os números
-        df_savs_terceiros['CPF do responsável pela SAV:'] = df_savs_terceiros['CPF do responsável pela SAV:'].str.replace(r'[^\d]+', '', regex=True)
-
-
-        # Filtar SAVs com o CPF do usuário
-        df_savs_terceiros = df_savs_terceiros[df_savs_terceiros['CPF do responsável pela SAV:'].astype(str) == str(usuario['cpf'])]
-
-        # Capturar a data da viagem
-        df_savs_terceiros['Data da viagem:'] = df_savs_terceiros['Itinerário:'].str[6:16].replace('-', '/', regex=True)
-
-        # Expressão regular para capturar o nome da cidade de chegada
-        destinos = r'Cidade de chegada: (.*?)(?:,|$)'
-        
-        
-        # Aplicar a regex para cada linha da coluna
-        df_savs_terceiros["Destinos:"] = df_savs_terceiros["Itinerário:"].apply(lambda x: ' > '.join(re.findall(destinos, x)))
-
-
-        # Criar cabeçalho da "tabela"
-        col1, col2, col3, col4, col5, col6 = st.columns([2, 2, 4, 6, 3, 3])
-
-        col1.write('Código da viagem')
-        col2.write('Data da viagem')
-        col3.write('Nome do(a) viajante')
-        col4.write('Destinos')
-        col5.write('Solicitações')
-        col6.write('Relatórios')
-
-        # Iterar sobre a lista de viagens
-        for index, row in df_savs_terceiros[::-1].iterrows():
-
-            # Preparar o link personalizado para o relatório -----------------------------------------------------
-
-            # Extrair cidade(s) de destino
-            # Transformar o itinerário em uma lista de dicionários
-            trechos = parse_itinerario(row["Itinerário:"])
+        # Das SAVs de terceiros, só as que têm o usuário como responsável, com a data da viagem e os destinos calculados no snapshot
+        with medir_fase_home("terceiros_dados"):
+            snapshots = carregar_snapshots(ABAS_TERCEIROS)
+            df_savs_terceiros = linhas_do_cpf(snapshots["SAVs TERCEIROS Portal"], "CPF do responsável pela SAV:", usuario['cpf'])
+            snapshot_rvss_terceiros = snapshots["RVSs TERCEIROS Portal"]
+
+            # Da viagem mais recente para a mais antiga. Os relatórios são buscados só para as viagens mostradas
+            df_lista_terceiros = df_savs_terceiros[::-1]
+
+        with medir_fase_home("terceiros_lista"):
+            mostrar_lista_viagens(
+                df_lista_terceiros,
+                snapshot_rvss_terceiros,
+                colunas=['Código da viagem:', 'Data inicial:', 'Nome do(a) viajante:', 'Destinos:'],
+                titulos=['Código da viagem', 'Data da viagem', 'Nome do(a) viajante', 'Destinos', 'Solicitações', 'Relatórios'],
+                larguras=[2, 2, 4, 6, 3, 3],
+                chave_url_rvs="url_rvs_trc",
+                chave_lista="terceiros",
+            )
 
-            # Pegando a primeira e a última data
-            data_inicial = trechos[0]["Data"]
-            data_final = trechos[-1]["Data"]
 
-            # Formata a data do período da viagem para o formato DD/MM/YYYY a DD/MM/YYYY
-            periodo_viagem = f"{data_inicial} a {data_final}".replace('-', '/')
 
-# !!!!!!!!!!!!!!!!!!!!
-            # Extraindo todas as "Cidade de chegada" e concatenando com vírgula
-            # if st.session_state.tipo_usuario == "interno":
-            cidades_chegada = [viagem["Cidade de chegada"] for viagem in trechos]
-            # elif st.session_state.tipo_usuario == "externo":
-            #     cidades_chegada = [viagem["Cidade de chegada"] for viagem in trechos]
-            
-            destinos = ", ".join(cidades_chegada)
+# ##################################################################
+# PERFIL DE EXECUÇÃO (ADMINISTRAÇÃO)
+# ##################################################################
 
+# Perfil de uma execução do script, para investigar lentidão com os dados reais de um usuário.
+# Só é ligado quando a URL tem ?perfil=<chave>, com a chave da seção [perfil] do st.secrets.
+# Sem chave configurada, o perfil não existe; sem o parâmetro na URL, a execução não tem nenhum custo a mais.
+CHAVE_PERFIL = st.secrets.get("perfil", {}).get("chave", "")
 
-# !!!!!!!!!!!!!!!!!!!
-            # Prepara as URLs de formulários com alguns campos pré-preenchidos
-            if st.session_state.tipo_usuario == "interno":
-                # URL do formulário de RVS de Terceiros
-                params = {
-                    "codigoDa": row["Código da viagem:"],
-                    "qualE": row["Qual é a fonte do recurso?"],
-                    "responsavel": row["Responsável pela SAV:"],
-                    "nome_viajante": row["Nome do(a) viajante:"],
-                    "email": row["E-mail:"],
-                    "cidadesDe": destinos,
-                    "periodoDa": periodo_viagem
-                }
+# Funções acompanhadas no resumo do perfil (as demais aparecem só no arquivo para download)
+FUNCOES_PERFIL = [
+    "parse_itinerario", "iterrows", "itertuples", "carregar_snapshots", "ler_e_tratar", "ler_intervalos",
+    "linhas_do_cpf", "buscar_relatorio", "usuario_impedido", "buscar_externos", "mostrar_lista_viagens",
+]
 
-                jotform_rvs_terceiros_url = f"{st.secrets['links']['url_rvs_trc']}?{encode_params(params)}"
-                
-                
 
-#             # ----------------------------------------------------------------------------------------------------- 
+# Diz se o perfil foi pedido nesta execução (comparação em tempo constante, para não vazar a chave)
+def perfil_ativo():
+    if not CHAVE_PERFIL:
+        return False
+    return hmac.compare_digest(st.query_params.get("perfil", "").encode(), CHAVE_PERFIL.encode())
+
+
+# Resumo do perfil: tempo acumulado das funções acompanhadas, dos elementos e widgets do Streamlit chamados
+# pelo portal, e tempo próprio por pacote (portal, pandas, streamlit...)
+def resumir_perfil(estatisticas):
+    funcoes = {}
+    widgets = {}
+    pacotes = {}
+
+    for (arquivo, _, nome), (_, chamadas, tempo_proprio, tempo_acumulado, chamadores) in estatisticas.items():
+        if nome in FUNCOES_PERFIL:
+            acumulado = funcoes.setdefault(nome, [0, 0.0])
+            acumulado[0] += chamadas
+            acumulado[1] += tempo_acumulado
+
+        # Widgets e elementos: toda chamada st.* passa pelo wrapper de métricas de uso do Streamlit.
+        # Um elemento que chama outro (st.write chama o markdown) aparece nas duas linhas.
+        if f"{os.sep}streamlit{os.sep}elements{os.sep}" in arquivo:
+            for (arquivo_chamador, _, _), (_, chamadas_chamador, _, tempo_chamador) in chamadores.items():
+                if arquivo_chamador.endswith(f"{os.sep}metrics_util.py"):
+                    acumulado = widgets.setdefault(f"st.{nome}", [0, 0.0])
+                    acumulado[0] += chamadas_chamador
+                    acumulado[1] += tempo_chamador
+
+        if arquivo == __file__:
+            pacote = "portal (main.py)"
+        elif "site-packages" in arquivo:
+            pacote = arquivo.split("site-packages", 1)[1].strip(os.sep).split(os.sep)[0]
+        else:
+            pacote = "python"
+        pacotes[pacote] = pacotes.get(pacote, 0.0) + tempo_proprio
 
-#             # Conteúdo da lista de viagens
+    def tabela(itens, colunas):
+        return pd.DataFrame([[nome, *valores] for nome, valores in itens], columns=colunas).sort_values(colunas[-1], ascending=False)
 
-            col1, col2, col3, col4, col5, col6 = st.columns([2, 2, 4, 6, 3, 3])
-            
-            col1.write(row['Código da viagem:'])
-            col2.write(row['Data da viagem:'])
-            col3.write(row['Nome do(a) viajante:'])
-            col4.write(row['Destinos:'])
-            col5.button('Detalhes', key=f"detalhes_terc_{index}", on_click=mostrar_detalhes_sav, args=(row,), use_container_width=True, icon=":material/info:")
-            
+    return (
+        tabela(funcoes.items(), ["Função", "Chamadas", "Tempo (s)"]),
+        tabela(widgets.items(), ["Elemento", "Chamadas", "Tempo (s)"]),
+        tabela(((pacote, [tempo]) for pacote, tempo in pacotes.items()), ["Pacote", "Tempo próprio (s)"]),
+    )
 
-            # Botão dinâmico sobre o relatório --------------------------------------------
 
-            # Verificar se o relatório foi entregue. Procura se tem o código da SAV em algum relatório 
-            if row['Código da viagem:'].upper() in df_rvss_terceiros['Código da viagem:'].str.upper().values:
+# Mostra o resumo do perfil no fim da página, com o perfil completo para download (abre no snakeviz ou no pstats)
+def mostrar_perfil(perfil, duracao):
+    perfil.create_stats()
+    funcoes, widgets, pacotes = resumir_perfil(perfil.stats)
 
-                status_relatorio = "entregue"
+    with st.expander(f":material/speed: Perfil desta execução ({duracao:.2f} s)"):
+        barra = st.column_config.ProgressColumn(format="%.3f", min_value=0.0, max_value=max(duracao, 1e-9))
 
-            # Se não tem nenhum relatório com esse código de SAV
-            else:
-                status_relatorio = "pendente"
+        col1, col2, col3 = st.columns(3)
+        col1.dataframe(funcoes, hide_index=True, column_config={"Tempo (s)": barra})
+        col2.dataframe(widgets, hide_index=True, column_config={"Tempo (s)": barra})
+        col3.dataframe(pacotes, hide_index=True, column_config={"Tempo próprio (s)": barra})
 
+        st.download_button(
+            "Baixar perfil completo (.prof)",
+            data=marshal.dumps(perfil.stats),
+            file_name=f"perfil_{st.session_state.logged_in}_{time.strftime('%Y%m%d_%H%M%S')}.prof",
+            icon=":material/download:",
+        )
 
 
-            # Se o relatório foi entregue, vê o relatório  
-            if status_relatorio == "entregue":
-                col6.button('Relatório entregue', key=f"entregue_ter_{index}", on_click=mostrar_detalhes_rvs, args=(row, df_rvss_terceiros), use_container_width=True, icon=":material/check:", type="primary")
-            
-            # Se não foi entregue, botão para enviar
-            # else:
-            elif status_relatorio == "pendente":
-                # Se não foi entregue, botão para enviar
-                col6.link_button('Enviar relatório', use_container_width=True, icon=":material/description:", url=jotform_rvs_terceiros_url)
+# Executa o bloco com o profiler ligado, quando o perfil foi pedido na URL.
+# Se a página terminar com st.rerun() ou st.stop(), o perfil é descartado junto com a execução.
+@contextmanager
+def perfilar_execucao():
+    if not perfil_ativo():
+        yield
+        return
 
-            st.divider()  # Separador entre cada linha da tabela
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # Só um profiler por vez no processo (Python 3.12+): outra sessão já está sendo perfilada
+        st.toast("Já há um perfil em andamento em outra sessão.", icon=":material/hourglass_top:")
+        yield
+        return
+
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        perfil.disable()
+    mostrar_perfil(perfil, time.perf_counter() - inicio)
 
 
 
@@ -1657,22 +3336,41 @@ def home_page():
 # NAVEGAÇÃO DE PÁGINAS
 # ##################################################################
 
+# Sem conexão com o banco de dados não há login nem cadastro. Mostra o erro em vez de travar a página.
+if banco_de_dados is None:
+    col1, col2, col3 = st.columns([3, 6, 3])
+    col2.error("Não foi possível conectar ao banco de dados. Tente novamente em alguns instantes.", icon=":material/cloud_off:")
+    col2.button("Tentar novamente", icon=":material/refresh:")
+    st.stop()
+
 # Verifica se o usuário já está logado
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = "etapa_1_cpf"  # Define o estado de login como falso inicialmente
 
-# Exibe a página de login ou a página principal, dependendo do estado de login
-if st.session_state.logged_in == "etapa_1_cpf":
-    pagina_login_etapa_1()  
+# Identificador da sessão nas métricas, para contar as sessões ativas
+if "id_sessao" not in st.session_state:
+    st.session_state.id_sessao = uuid.uuid4().hex
+
+metricas = obter_metricas()
+metricas.registrar_sessao(st.session_state.id_sessao, st.session_state.logged_in)
+
+# Receptor dos webhooks do JotForm, iniciado uma vez por processo (se configurado)
+iniciar_receptor_webhooks()
+
+# Exibe a página de login ou a página principal, dependendo do estado de login.
+# A duração do rerun é medida mesmo quando a página termina com st.rerun() ou st.stop().
+with metricas.rerun_duracao.labels(st.session_state.logged_in).time(), perfilar_execucao():
+    if st.session_state.logged_in == "etapa_1_cpf":
+        pagina_login_etapa_1()  
 
-# Depois de colocar o cpf, vai pra etapa do recebimento do código por email
-elif st.session_state.logged_in == "etapa_2_codigo":
-    pagina_login_etapa_2()  
+    # Depois de colocar o cpf, vai pra etapa do recebimento do código por email
+    elif st.session_state.logged_in == "etapa_2_codigo":
+        pagina_login_etapa_2()  
 
-# Usuário está logado, exibe a página inicial
-elif st.session_state.logged_in == "logado":
-    home_page()  
+    # Usuário está logado, exibe a página inicial
+    elif st.session_state.logged_in == "logado":
+        home_page()  
 
-# Usuário novo, exibe a página de cadastro
-elif st.session_state.logged_in == "novo_cadastro":
-    novo_cadastro()
\ No newline at end of file
+    # Usuário novo, exibe a página de cadastro
+    elif st.session_state.logged_in == "novo_cadastro":
+        novo_cadastro()
\ No newline at end of file